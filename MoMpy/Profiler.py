@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Per-stage timing of the analysis. The slow stages of Uncertainty and Webscraper (reading and converting csv files, the
+regressions, the Monte Carlo simulations, sympy, parsing the material table, ...) are wrapped in named spans that record their
+wall time, how many samples they handled and, optionally, their peak memory. Spans are off by default and then cost about as
+much as an empty with block.
+
+Example:
+
+    from MoMpy import Profiler, Uncertainty
+    with Profiler.profile(memory = True) as prof:
+        Uncertainty.getStressStrain("SampleUTMdata.csv", 41.93).E
+    print(prof.summary())
+
+Or, to watch every span as it ends: Profiler.add_listener(print); Profiler.enable()
+"""
+import functools
+import inspect
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+
+import pandas as pd
+
+
+class Span(namedtuple("Span", ["name", "seconds", "count", "peak_memory", "depth", "thread"])):
+
+    """
+    A finished span: its name, wall time in seconds, number of samples (None if not given), peak memory in bytes allocated
+    while it ran (None unless memory tracing is on), how many spans it was nested in, and the name of its thread.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        text = f"{'  '*self.depth}{self.name}: {self.seconds:.4f} s"
+        if self.count is not None:
+            text += f", {self.count} samples"
+        if self.peak_memory is not None:
+            text += f", {self.peak_memory/2**20:.2f} MB"
+        return text
+
+
+_enabled = False
+_memory = False
+_started_tracing = False #whether enable started tracemalloc, disable only stops it then
+_listeners = []
+_local = threading.local() #open spans and profile() collectors of each thread
+_profile_lock = threading.Lock()
+_active = 0 #profile() blocks running in any thread
+_before = (False, False) #(_enabled, _memory) before the first of them
+
+
+class _NullSpan:
+
+    """
+    What span returns while profiling is off, setting count on it does nothing.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_null = _NullSpan()
+
+
+class _Span:
+
+    __slots__ = ("name", "count", "start", "memory_start", "memory_peak", "parent")
+
+    def __init__(self, name, count):
+        self.name = name
+        self.count = count
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        self.memory_start = None
+        if _memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None and self.parent.memory_start is not None: #the reset below would lose the parent's peak so far
+                self.parent.memory_peak = max(self.parent.memory_peak, peak)
+            tracemalloc.reset_peak()
+            self.memory_start = self.memory_peak = current
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak = None
+        if self.memory_start is not None and tracemalloc.is_tracing():
+            self.memory_peak = max(self.memory_peak, tracemalloc.get_traced_memory()[1])
+            peak = self.memory_peak - self.memory_start
+            if self.parent is not None and self.parent.memory_start is not None:
+                self.parent.memory_peak = max(self.parent.memory_peak, self.memory_peak)
+        stack = _stack()
+        stack.pop()
+        _emit(Span(self.name, seconds, self.count, peak, len(stack), threading.current_thread().name))
+        return False
+
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+def _emit(span):
+    for collector in getattr(_local, "collectors", ()):
+        collector.append(span)
+    for listener in list(_listeners):
+        listener(span)
+
+
+def span(name, count = None):
+
+    """
+    Context manager that times a stage of the analysis while profiling is enabled.
+
+    Parameters:
+        name: str
+            name of the stage, spans with the same name are added up by Profile.summary.
+        count: int, optional
+            number of samples the stage handles, can also be set later with "as s: ... s.count = n".
+
+    Returns:
+        the span, or a shared object that does nothing while profiling is off.
+    """
+
+    if not _enabled:
+        return _null
+    return _Span(name, count)
+
+
+def profiled(name, count = None):
+
+    """
+    Decorator that runs a whole function in a span. count is the name of the argument that holds its number of samples.
+    """
+
+    def decorate(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            n = None
+            if count is not None:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                n = bound.arguments[count]
+            with _Span(name, n):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def enable(memory = False):
+
+    """
+    Turns the spans on. With memory = True their peak memory is also recorded with tracemalloc, which slows Python down.
+    """
+
+    global _enabled, _memory, _started_tracing
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    _enabled = True
+
+
+def disable():
+
+    """
+    Turns the spans off, and memory tracing if enable started it.
+    """
+
+    global _enabled, _memory, _started_tracing
+    _enabled = False
+    if _started_tracing and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _started_tracing = False
+    _memory = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def add_listener(callback):
+
+    """
+    Calls callback with every Span as it ends, from the thread that ran it.
+    """
+
+    _listeners.append(callback)
+
+
+def remove_listener(callback):
+    _listeners.remove(callback)
+
+
+class Profile:
+
+    """
+    Spans collected by profile(), in the order they ended.
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    def summary(self):
+
+        """
+        Returns:
+            a DataFrame with a row per span name: number of calls, total and mean seconds, total samples and the largest peak
+            memory, slowest first.
+        """
+
+        df = pd.DataFrame(self.spans, columns = Span._fields)
+        if df.empty:
+            return pd.DataFrame(columns = ["calls", "seconds", "mean_seconds", "count", "peak_memory"])
+        summary = df.groupby("name", sort = False).agg(calls = ("seconds", "size"), seconds = ("seconds", "sum"),
+                                                       mean_seconds = ("seconds", "mean"), count = ("count", lambda n: n.sum(min_count = 1)),
+                                                       peak_memory = ("peak_memory", "max"))
+        return summary.sort_values("seconds", ascending = False)
+
+    def __str__(self):
+        return "\n".join(str(span) for span in self.spans)
+
+
+class profile:
+
+    """
+    Context manager that enables profiling and collects the spans of the code in it (of this thread only, so two profiles in two
+    threads do not mix). Profiling is put back as it was once the last profile ends.
+
+    Example:
+        with profile() as prof:
+            ...
+        prof.summary()
+    """
+
+    def __init__(self, memory = False):
+        self.memory = memory
+        self.result = Profile()
+
+    def __enter__(self):
+        global _active, _before
+        with _profile_lock:
+            if _active == 0:
+                _before = (_enabled, _memory)
+            _active += 1
+            if not _enabled or (self.memory and not _memory):
+                enable(self.memory or _memory)
+        if not hasattr(_local, "collectors"):
+            _local.collectors = []
+        _local.collectors.append(self.result.spans)
+        return self.result
+
+    def __exit__(self, *exc):
+        global _active
+        _local.collectors.remove(self.result.spans)
+        with _profile_lock:
+            _active -= 1
+            if _active == 0 and _before != (_enabled, _memory): #the last profile puts things back as they were
+                disable()
+                if _before[0]:
+                    enable(_before[1])
+        return False
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: A long running local server for scripts that call MoMpy many times. Starting Python and importing sympy, scipy and pandas
+takes seconds, and so does the first use of every expression, so a script that runs once per specimen or formula spends most of
+its time starting up. The server imports everything once and keeps the compiled expressions and parsed UTM files in memory, and
+answers JSON requests over HTTP on localhost with a pool of worker threads. Client calls it like the functions themselves.
+
+Start it with:
+
+    python -m MoMpy.Server --port 8765
+
+and use it from a script:
+
+    from MoMpy.Server import Client
+    mompy = Client(port = 8765)
+    mompy.getStressStrain("specimen1.csv", 41.93, 67.01, 8.824)["E"]
+    mompy.get_RSS("x/y", evaluate = True, x = 1, y = 2, U_x = .1, U_y = .1)
+
+Every endpoint is a POST of a JSON object of the function's arguments to /<function name>, and GET /health lists them.
+"""
+import argparse
+import json
+import math
+import os
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+import pandas as pd
+
+from MoMpy import Profiler, Uncertainty, Webscraper
+
+HOST = "127.0.0.1" #only this computer can connect
+PORT = 8765
+
+
+def _jsonable(value):
+
+    """
+    Converts results to something json can write: numpy numbers to floats, DataFrames to a list of rows, sympy expressions to
+    strings, and NaN or infinite numbers to None.
+    """
+
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient = "records"))
+    if isinstance(value, pd.Series):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return [_jsonable(v) for v in value.tolist()]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def _getStressStrain(filename, area, mass = 1, volume = 1, MC_sim = False, elastic_region = "fixed", curve = False):
+    result = Uncertainty.getStressStrain(filename, area, mass, volume, MC_sim, elastic_region = elastic_region, need_curve = curve)
+    properties = {name: getattr(result, name) for name in Uncertainty._batch_properties}
+    if MC_sim:
+        properties["E_uncertainty"] = result.E_uncertainty
+    if curve:
+        properties["strain"], properties["stress"] = result.strain, result.stress
+    return properties
+
+
+def _get_RSS(expr, evaluate = False, unicode = False, excel = False, values = None):
+    return {"result": Uncertainty.get_RSS(expr, evaluate, unicode, excel, **(values or {}))}
+
+
+def _MonteCarlo(expr, N = 10000, samples = False, seed = None, tol = None, max_sims = 10**7, sampler = "random", values = None):
+    result = Uncertainty.MonteCarlo(expr, N, samples, seed, tol, max_sims, sampler = sampler, **(values or {}))
+    return result._asdict()
+
+
+def _getMonteCarlo(x, y, U_x, U_y, num_sims = 4000, slope = False, integral = False, seed = None, tol = None, max_sims = 10**7,
+                   sampler = "random"):
+    value, uncertainty = Uncertainty.getMonteCarlo(x, y, U_x, U_y, num_sims, slope, integral, seed, tol = tol, max_sims = max_sims,
+                                                   sampler = sampler)
+    return {"value": value, "uncertainty": uncertainty}
+
+
+ENDPOINTS = {"getStressStrain": _getStressStrain,
+             "get_RSS": _get_RSS,
+             "MonteCarlo": _MonteCarlo,
+             "getMonteCarlo": _getMonteCarlo,
+             "Get_MatE": Webscraper.Get_MatE,
+             "Get_MatU": Webscraper.Get_MatU,
+             "Get_MatY": Webscraper.Get_MatY,
+             "Get_MatNearest": Webscraper.Get_MatNearest,
+             "Get_Prop": Webscraper.Get_Prop}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    server_version = "MoMpy"
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("", "/health"):
+            self._reply(200, {"status": "ok", "endpoints": sorted(ENDPOINTS)})
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}, POST to /<function>"})
+
+    def do_POST(self):
+        name = self.path.strip("/")
+        if name not in ENDPOINTS:
+            self._reply(404, {"error": f"unknown function {name}", "type": "NotFound"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            arguments = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(arguments, dict):
+                raise ValueError("the request must be a JSON object of the arguments")
+        except ValueError as error:
+            self._reply(400, {"error": str(error), "type": "BadRequest"})
+            return
+        try:
+            with Profiler.span("server " + name):
+                result = ENDPOINTS[name](**arguments)
+        except Exception as error: #reported to the client, the server keeps running
+            self._reply(400, {"error": str(error), "type": type(error).__name__})
+            return
+        self._reply(200, {"result": _jsonable(result)})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class AnalysisServer(HTTPServer):
+
+    """
+    HTTP server that hands each connection to a pool of worker threads, so slow requests do not hold up the others.
+    """
+
+    def __init__(self, host = HOST, port = PORT, workers = 4, verbose = False):
+        super().__init__((host, port), _Handler)
+        self.pool = ThreadPoolExecutor(max_workers = workers)
+        self.verbose = verbose
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._work, request, client_address)
+
+    def _work(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait = False)
+
+
+def warm_up():
+
+    """
+    Imports sympy and scipy and compiles a first expression, so the first request does not pay for them.
+    """
+
+    Uncertainty.get_RSS("x/y", evaluate = True, x = 1, y = 1, U_x = 1, U_y = 1)
+    Uncertainty.getMonteCarlo([0, 1, 2], [0, 1, 2], [1, 1, 1], [1, 1, 1], num_sims = 10, slope = True)
+    Uncertainty.sp.stats.linregress([0, 1, 2], [0, 1, 2])
+
+
+def serve(host = HOST, port = PORT, workers = 4, verbose = False, warm = True, table = None):
+
+    """
+    Runs the server until it is interrupted.
+
+    Parameters:
+        host, port: address to listen on, localhost only by default.
+        workers: int, optional
+            number of requests handled at once.
+        warm: bool, optional
+            imports and compiles everything before the first request.
+        table: str, optional
+            saved copy of the material table page for the lookups, see Webscraper.Load_Table.
+    """
+
+    if table is not None:
+        Webscraper.Load_Table(table)
+    if warm:
+        warm_up()
+    server = AnalysisServer(host, port, workers, verbose)
+    print(f"MoMpy server on http://{server.server_address[0]}:{server.server_address[1]}", flush = True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class ServerError(RuntimeError):
+
+    """
+    An error the server reported for a request, its type is the name of the original exception.
+    """
+
+    def __init__(self, message, type = None):
+        super().__init__(message)
+        self.type = type
+
+
+class Client:
+
+    """
+    Calls a running MoMpy server with the same arguments as the MoMpy functions. Results come back as json: numbers, lists and
+    dictionaries (a dictionary of properties for getStressStrain, a list of rows for the material lookups).
+    """
+
+    def __init__(self, host = HOST, port = PORT, timeout = 600):
+        self.url = f"http://{host}:{port}/"
+        self.timeout = timeout
+
+    def call(self, name, **arguments):
+        request = urllib.request.Request(self.url + name, data = json.dumps(_jsonable(arguments)).encode("utf-8"),
+                                         headers = {"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout = self.timeout) as response:
+                return json.loads(response.read())["result"]
+        except urllib.error.HTTPError as error:
+            body = json.loads(error.read() or b"{}")
+            raise ServerError(body.get("error", str(error)), body.get("type")) from None
+
+    def health(self):
+        with urllib.request.urlopen(self.url + "health", timeout = self.timeout) as response:
+            return json.loads(response.read())
+
+    def getStressStrain(self, filename, area, mass = 1, volume = 1, MC_sim = False, elastic_region = "fixed", curve = False):
+        return self.call("getStressStrain", filename = os.path.abspath(filename), area = area, mass = mass, volume = volume,
+                         MC_sim = MC_sim, elastic_region = elastic_region, curve = curve)
+
+    def get_RSS(self, expr, evaluate = False, unicode = False, excel = False, **kwargs):
+        result = self.call("get_RSS", expr = str(expr), evaluate = evaluate, unicode = unicode, excel = excel, values = kwargs)
+        return result["result"]
+
+    def MonteCarlo(self, expr, N = 10000, samples = False, seed = None, tol = None, max_sims = 10**7, sampler = "random", **kwargs):
+        return self.call("MonteCarlo", expr = str(expr), N = N, samples = samples, seed = seed, tol = tol, max_sims = max_sims,
+                         sampler = sampler, values = kwargs)
+
+    def getMonteCarlo(self, x, y, U_x, U_y, num_sims = 4000, slope = False, integral = False, seed = None, tol = None,
+                      max_sims = 10**7, sampler = "random"):
+        result = self.call("getMonteCarlo", x = x, y = y, U_x = U_x, U_y = U_y, num_sims = num_sims, slope = slope,
+                           integral = integral, seed = seed, tol = tol, max_sims = max_sims, sampler = sampler)
+        return result["value"], result["uncertainty"]
+
+    def Get_MatE(self, value, tolerance = .1):
+        return self.call("Get_MatE", value = value, tolerance = tolerance)
+
+    def Get_MatU(self, value, tolerance = .1):
+        return self.call("Get_MatU", value = value, tolerance = tolerance)
+
+    def Get_MatY(self, value, tolerance = .1):
+        return self.call("Get_MatY", value = value, tolerance = tolerance)
+
+    def Get_MatNearest(self, E = None, U = None, Y = None, n = 5):
+        return self.call("Get_MatNearest", E = E, U = U, Y = Y, n = n)
+
+    def Get_Prop(self, mat):
+        return self.call("Get_Prop", mat = mat)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Local MoMpy analysis server.")
+    parser.add_argument("--host", default = HOST, help = "address to listen on, localhost by default")
+    parser.add_argument("--port", type = int, default = PORT)
+    parser.add_argument("--workers", type = int, default = 4, help = "requests handled at once")
+    parser.add_argument("--verbose", action = "store_true", help = "log every request")
+    parser.add_argument("--table", help = "saved copy of the material table page to use for the lookups")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.verbose, table = args.table)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,20 +7,122 @@ Purpose: Several high level functions that can calculate uncertainties either wi
 
 """
 import numpy as np
-import scipy as sp
-import sympy as sym
-from scipy.stats import norm
-import random
+import scipy as sp #scipy loads its submodules (stats, integrate) on first use
 import pandas as pd
+import os
+import glob
+import io
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import namedtuple, OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache
+
+try:
+    from MoMpy import Profiler
+except ImportError: #imported from inside the MoMpy folder, like "from Uncertainty import *"
+    import Profiler
 
 import warnings
 warnings.filterwarnings("ignore") #lin regression gives runtime errors on occasion. 
 
+UTM_CACHE_MAX_BYTES = 256*2**20 #size cap of the in-memory cache of parsed UTM files
+UTM_CACHE_DIR = None #set to a folder to also keep parsed UTM files on disk as .npz files
+CURVE_MEMORY_BUDGET = None #bytes a curve from getStressStrain may take, larger files are read as float32 or else streamed
+
+@lru_cache(maxsize = 256)
+def _parse_expr(expr):
+    
+    """
+    Sympifies an expression once and returns it with its symbols in a fixed (alphabetical) order.
+    Cached so the same string is only ever parsed once.
+    """
+    
+    import sympy as sym #sympy takes a while to import and only the RSS and MonteCarlo functions need it
+    
+    if isinstance(expr,str):
+        expr = sym.sympify(expr)
+    symbols = tuple(sorted(expr.free_symbols, key = str)) #free_symbols is a set, sorting keeps the argument order stable
+    
+    return expr, symbols
+
+
+@lru_cache(maxsize = 256)
+def _lambdified(expr, symbols):
+    
+    """
+    numpy function of an expression, cached per expression and symbol ordering so repeat calls skip lambdify.
+    """
+    
+    import sympy as sym
+    
+    return sym.lambdify(symbols, expr, "numpy")
+
+
+@lru_cache(maxsize = 256)
+def _rss_terms(expr):
+    
+    """
+    Differentiates an expression once. Returns the expression, its symbols, the matching U_ symbols, the partial derivatives and the
+    (not square rooted) RSS expression. Cached per expression.
+    """
+    
+    import sympy as sym
+    
+    expr, symbols = _parse_expr(expr)
+    U_symbols = tuple(sym.symbols("U_"+str(symbol)) for symbol in symbols) #every symbol gets a corresponding uncertainty symbol
+    partials = tuple(sym.diff(expr,symbol) for symbol in symbols)
+    rss = sym.Add(*[partial**2*U_symbol**2 for partial, U_symbol in zip(partials, U_symbols)]) #RSS formula, not square rooted yet
+    
+    return expr, symbols, U_symbols, partials, rss
+
+
+@lru_cache(maxsize = 256)
+def _compile_gradient(expr):
+    
+    """
+    Compiles the partial derivatives of an expression into one numpy function. sym.cse pulls out the subexpressions the partials
+    share so they are only evaluated once. Cached per expression.
+    
+    Returns:
+        the symbols in argument order and a function of their values that returns the list of partial derivatives.
+    """
+    
+    import sympy as sym
+    
+    expr, symbols, U_symbols, partials, rss = _rss_terms(expr)
+    
+    return symbols, sym.lambdify(symbols, list(partials), "numpy", cse = True) #cse is applied to the partials together
+
+
+@lru_cache(maxsize = 256)
+def _compile_rss(expr):
+    
+    """
+    Compiles the RSS uncertainty of an expression from its compiled gradient. Cached per expression, so repeat evaluations cost
+    microseconds.
+    
+    Returns:
+        the symbols in argument order and a function that takes an array of values and an array of uncertainties (same order)
+        and returns the RSS uncertainty. Arrays may have extra trailing dimensions to evaluate many cases at once.
+    """
+    
+    symbols, gradient = _compile_gradient(expr)
+    
+    def rss_function(values, uncertainties):
+        terms = [(partial*U)**2 for partial, U in zip(gradient(*values), uncertainties)]
+        return np.sqrt(sum(terms))
+    
+    return symbols, rss_function
+
+
 def get_RSS(expr, evaluate = False, unicode = False, excel = False, **kwargs):
 
     """
     Returns the Root Sum Square uncertainty of an algebraic expression. User has the option to make it compatible with Microsoft's unicode,
-    Microsoft's excel syntax, or evaluate the expression. 
+    Microsoft's excel syntax, or evaluate the expression. The derivatives are only calculated once per expression, evaluating
+    uses a compiled numpy function.
     
     Parameters:
     
@@ -41,43 +143,28 @@ def get_RSS(expr, evaluate = False, unicode = False, excel = False, **kwargs):
         An algebraic expression if evaluate = False. If excel or unicode, it returns a string. If evaluate, it returns a float.
     """
     
-    if isinstance(expr,str): #checks if the expression is a string, converts to sympy expr if it is
-        expr = sym.sympify(expr)
-        
-    rss = 0 #RSS expression
-    symbols = list(expr.free_symbols) #this method takes all of the variables in a sympy expression and puts them in a set.
-    U_symbol = [] #list of uncertainty variable symbols
-    U_sub = [] #corresponding values for the list above
-    symbol_sub = [] #list of values that correspond to symbols respective values
+    import sympy as sym
     
-            
-    for i, symbol in enumerate(symbols):
-                
-        U_symbol += ["U_"+str(symbol)] #for every symbol in the expression, there will be a corresponding uncertainty symbol
-        U_symbol[i] = sym.symbols(U_symbol[i]) #symbolizes the previous line
-        
-        if evaluate and str(symbol) not in kwargs: #checks if there is any missing value provided in kwargs
-            raise ValueError(f"Symbol {symbol} value MUST be provided")
-        elif evaluate and str(U_symbol[i]) not in kwargs:
-            raise ValueError(f"Uncertainty {U_symbol[i]} value MUST be provided.")
-        
-        for j in kwargs: #loops through kwargs to check if the symbols match the any kwargs 
-            if str(symbol) == j:
-                symbol_sub += [kwargs[j]]#if they do match the corresponding subs list gets the variable at the same index as symbol
-            elif str(U_symbol[i]) == j:
-                U_sub += [kwargs[j]]               
-
-        rss +=  sym.diff(expr,symbol)**2*U_symbol[i]**2 #RSS formula, not square rooted yet
+    with Profiler.span("get_RSS sympy"): #derivatives, only slow the first time for each expression
+        expr, symbols, U_symbols, partials, rss = _rss_terms(expr)
+    
+    if evaluate:
+        for symbol, U_symbol in zip(symbols, U_symbols): #checks if there is any missing value provided in kwargs
+            if str(symbol) not in kwargs:
+                raise ValueError(f"Symbol {symbol} value MUST be provided")
+            elif str(U_symbol) not in kwargs:
+                raise ValueError(f"Uncertainty {U_symbol} value MUST be provided.")
 
     if (excel and evaluate) or (unicode and evaluate): #can't do both :P
         raise ValueError("Cannot use evaluate and unicode/excel simultaneously")
         
     elif evaluate:
         
-        for i,symbol in enumerate(symbols): #evaluating the RSS expression with the substituted values
-            rss_evaluated = rss.subs([(symbol,symbol_sub[i]),(U_symbol[i],U_sub[i])])
-            rss = rss_evaluated
-        result = float(sym.nsimplify(sym.sqrt(rss_evaluated)).evalf())
+        with Profiler.span("get_RSS evaluate"):
+            symbols, rss_function = _compile_rss(expr)
+            symbol_sub = [kwargs[str(symbol)] for symbol in symbols]
+            U_sub = [kwargs["U_"+str(symbol)] for symbol in symbols]
+            result = float(rss_function(symbol_sub, U_sub))
         
     elif unicode and not evaluate:
         result = str(sym.sqrt(rss))
@@ -94,10 +181,425 @@ def get_RSS(expr, evaluate = False, unicode = False, excel = False, **kwargs):
     return result
 
 
-def getMonteCarlo(x, y, U_x, U_y, num_sims = 4000, slope = False, integral = False):
+def get_RSS_batch(expr, data):
+    
+    """
+    Evaluates an expression and its Root Sum Square uncertainty for every row of a table of measurements at once.
+    Uses the same derivatives as get_RSS, compiled once per expression.
+    
+    Parameters:
+        expr: sympy_object, string
+            a syntatically correct algebraic equation.
+        data: pandas DataFrame or dict
+            a column (or array) for each variable and another named U_ + variable with its uncertainty. Scalars are used
+            for every row.
+            
+    Returns:
+        a numpy array of nominal values and a numpy array of RSS uncertainties, one per row.
+    """
+    
+    expr, symbols = _parse_expr(expr)
+    
+    for symbol in symbols: #checks if there is any missing column
+        if str(symbol) not in data:
+            raise ValueError(f"Symbol {symbol} value MUST be provided")
+        elif "U_"+str(symbol) not in data:
+            raise ValueError(f"Uncertainty U_{symbol} value MUST be provided.")
+    
+    columns = [np.asarray(data[str(symbol)], dtype = float) for symbol in symbols]
+    columns += [np.asarray(data["U_"+str(symbol)], dtype = float) for symbol in symbols]
+    columns = np.broadcast_arrays(*columns) if columns else []
+    symbol_sub, U_sub = columns[:len(symbols)], columns[len(symbols):]
+    shape = columns[0].shape if columns else ()
+    
+    _, rss_function = _compile_rss(expr)
+    values = np.broadcast_to(_lambdified(expr, symbols)(*symbol_sub), shape).astype(float)
+    uncertainties = np.broadcast_to(rss_function(symbol_sub, U_sub), shape).astype(float)
+    
+    return values, uncertainties
+
+
+def _covariance(names, data, cov, correlation, shape):
+    
+    """
+    Covariance matrix (or one per row, shape + (k, k)) of the variables names in that order for get_RSS_cov and MonteCarloCov.
+    Either cov is given directly, or it is built from the U_ uncertainties in data and the correlation coefficients.
+    """
+    
+    k = len(names)
+    if cov is not None:
+        if isinstance(cov, pd.DataFrame):
+            cov = cov.reindex(index = names, columns = names)
+        cov = np.asarray(cov, dtype = float)
+    else:
+        missing = [name for name in names if "U_" + name not in data]
+        if missing:
+            raise ValueError(f"Uncertainty U_{missing[0]} value MUST be provided, or a covariance matrix.")
+        R = np.eye(k)
+        if isinstance(correlation, dict): #{("w", "t"): .8, ...}, unlisted pairs are uncorrelated
+            for (a, b), rho in correlation.items():
+                i, j = names.index(str(a)), names.index(str(b))
+                R[i, j] = R[j, i] = rho
+        elif isinstance(correlation, pd.DataFrame):
+            R = correlation.reindex(index = names, columns = names).to_numpy(dtype = float)
+        elif correlation is not None:
+            R = np.asarray(correlation, dtype = float)
+        U = np.stack([np.broadcast_to(np.asarray(data["U_" + name], dtype = float), shape) for name in names], axis = -1)
+        cov = U[..., :, None]*R*U[..., None, :]
+        
+    if cov.shape[-2:] != (k, k) or np.isnan(cov).any():
+        raise ValueError(f"The covariance matrix must be {k} by {k}, for the variables {names} in that order.")
+        
+    return cov
+
+
+def get_RSS_cov(expr, data, cov = None, correlation = None):
+    
+    """
+    First order (linear) propagation of correlated uncertainties, sqrt(J Σ J^T) where J is the gradient of the expression and Σ
+    the covariance matrix of the variables, for every row of a table of measurements at once. Σ is in the units of the
+    uncertainties squared, so a diagonal Σ of the U_ values squared gives the same result as get_RSS. Uses the derivatives get_RSS
+    takes, compiled once per expression. MonteCarloCov checks it by simulation.
+    
+    Parameters:
+        expr: sympy_object, string
+            a syntatically correct algebraic equation.
+        data: pandas DataFrame or dict
+            a column (or array, or scalar) for each variable, and U_ columns when cov is not given.
+        cov: numpy array or DataFrame, optional
+            covariance matrix of the variables in alphabetical order (or labelled as a DataFrame), or one per row.
+        correlation: dict, numpy array or DataFrame, optional
+            used with the U_ columns when cov is not given, e.g. {("w", "t"): .8} when width and thickness were measured with
+            the same caliper. Pairs that are not listed are independent.
+            
+    Returns:
+        a numpy array of nominal values and a numpy array of propagated uncertainties, one per row.
+    """
+    
+    expr, symbols = _parse_expr(expr)
+    names = [str(symbol) for symbol in symbols]
+    
+    for name in names: #checks if there is any missing column
+        if name not in data:
+            raise ValueError(f"Symbol {name} value MUST be provided")
+    
+    columns = np.broadcast_arrays(*[np.asarray(data[name], dtype = float) for name in names]) if names else []
+    shape = columns[0].shape if names else ()
+    Sigma = _covariance(names, data, cov, correlation, shape)
+    
+    _, gradient = _compile_gradient(expr)
+    J = np.stack([np.broadcast_to(partial, shape) for partial in gradient(*columns)], axis = -1) if names else np.zeros(shape + (0,))
+    variance = np.einsum("...i,...ij,...j->...", J, Sigma, J)
+    values = np.broadcast_to(_lambdified(expr, symbols)(*columns), shape).astype(float)
+    
+    return values, np.sqrt(variance)
+
+
+def _mc_slopes(x_mc, y_mc):
+    
+    """
+    Closed form least squares slope of every row of a (num_sims, n_points) batch of simulated data.
+    """
+    
+    x_dev = x_mc - x_mc.mean(axis = 1, keepdims = True) #deviations from the mean of each simulation
+    y_dev = y_mc - y_mc.mean(axis = 1, keepdims = True)
+    
+    return (x_dev*y_dev).sum(axis = 1)/(x_dev**2).sum(axis = 1) #same slope linregress gives, one per row
+
+
+def _mc_integrals(x_mc, y_mc):
+    
+    """
+    Simpson's rule integral of every row of a (num_sims, n_points) batch of simulated data.
+    """
+    
+    if x_mc.shape[1] < 3: #simpson needs 3 points, fall back to the trapezoid rule
+        return sp.integrate.trapezoid(y_mc, x = x_mc, axis = 1)
+    return sp.integrate.simpson(y_mc, x = x_mc, axis = 1)
+
+
+SAMPLERS = ("random", "sobol", "halton", "lhs")
+
+
+def _make_sampler(sampler, d, rng):
+    
+    """
+    Standard normal draws of dimension d for the Monte Carlo functions. "random" uses the numpy Generator directly (returns None),
+    "sobol", "halton" and "lhs" (Latin hypercube) are scrambled low discrepancy sequences from scipy.stats.qmc seeded from rng, put
+    through the inverse normal CDF. A sampler keeps its place in the sequence between calls, so chunks continue the same sequence.
+    Sobol points are only balanced in blocks of a power of two, so the Sobol sampler only draws such blocks (see _sobol_sizes)
+    and raises a ValueError for any other n.
+    
+    Returns:
+        None or a function of n that returns an (n, d) array of standard normal draws.
+    """
+    
+    if sampler not in SAMPLERS:
+        raise ValueError(f"sampler must be one of {SAMPLERS}")
+    if sampler == "random":
+        return None
+    
+    from scipy.stats import qmc
+    if sampler == "sobol":
+        engine = qmc.Sobol(d, scramble = True, seed = rng)
+    elif sampler == "halton":
+        engine = qmc.Halton(d, scramble = True, seed = rng)
+    else:
+        engine = qmc.LatinHypercube(d, seed = rng)
+    
+    tiny = np.finfo(float).eps #keeps the inverse CDF away from +/- infinity
+    
+    def draw(n):
+        if sampler == "sobol" and n & (n - 1):
+            raise ValueError(f"Sobol points are only balanced in blocks of a power of two, not {n}.")
+        return sp.special.ndtri(np.clip(engine.random(n), tiny, 1 - tiny))
+    draw.balanced = sampler == "sobol"
+    
+    return draw
+
+
+def _sobol_sizes(sampler, num_sims, max_sims):
+    
+    """
+    Numbers of simulations that keep Sobol points balanced: num_sims rounded up to a power of two, max_sims rounded down to a
+    multiple of it and the block size of the parallel mode rounded up to a power of two. Unchanged for the other samplers.
+    
+    Returns:
+        num_sims, max_sims and the block size.
+    """
+    
+    if sampler != "sobol":
+        return num_sims, max_sims, MC_BLOCK
+    num_sims = 1 << (int(num_sims) - 1).bit_length()
+    
+    return num_sims, max(num_sims, max_sims//num_sims*num_sims), 1 << (MC_BLOCK - 1).bit_length()
+
+
+def _mc_draw(x, y, U_x, U_y, n, rng, calc, sampler = None):
+    
+    """
+    Simulates n data sets and returns the slope or integral (calc) of each one. sampler is from _make_sampler.
+    """
+    
+    #each data point is normally distributed with the data point as the mean and the uncertainty as two STDEVs
+    if sampler is None:
+        x_mc = rng.normal(x, U_x/2, size = (n, len(x)))
+        y_mc = rng.normal(y, U_y/2, size = (n, len(y)))
+    else:
+        z = sampler(n)
+        x_mc = x + U_x/2*z[:, :len(x)]
+        y_mc = y + U_y/2*z[:, len(x):]
+    
+    return calc(x_mc, y_mc)
+
+
+def _mc_batch(x, y, U_x, U_y, num_sims, rng, slope = True, chunk_size = 100000, callback = None, sampler = None):
+    
+    """
+    Batched engine behind getMonteCarlo. Draws (chunk_size, n_points) sample matrices with a numpy Generator and evaluates the
+    slope or integral of every simulated row at once instead of looping one simulation at a time.
+    
+    Parameters:
+        x, y, U_x, U_y: numpy arrays
+            1D arrays of the data points and their uncertainties (two STDEVs).
+        num_sims: int
+            number of simulations.
+        rng: numpy.random.Generator
+            source of the random draws.
+        slope: bool
+            True for linear regression slopes, False for simpson integrals.
+        chunk_size: int, optional
+            max number of simulations held in memory at once, keeps 1e6+ simulations from allocating huge matrices.
+        callback: function, optional
+            called with the fraction of simulations done after every chunk.
+        sampler: function, optional
+            from _make_sampler, None draws straight from rng.
+            
+    Returns:
+        a 1D numpy array of num_sims slopes or integrals.
+    """
+    
+    calc = _mc_slopes if slope else _mc_integrals
+    results = np.empty(num_sims)
+    if callback is not None:
+        chunk_size = min(chunk_size, max(num_sims//50, 1000)) #smaller chunks so progress is reported often
+    if getattr(sampler, "balanced", False):
+        chunk_size = 1 << (chunk_size.bit_length() - 1) #a power of two that divides num_sims, see _sobol_sizes
+    
+    for start in range(0, num_sims, chunk_size):
+        n = min(chunk_size, num_sims - start)
+        results[start:start + n] = _mc_draw(x, y, U_x, U_y, n, rng, calc, sampler)
+        if callback is not None:
+            callback((start + n)/num_sims)
+        
+    return results
+
+
+class _RunningStats:
+    
+    """
+    Streaming mean and variance (Welford's method, merging a whole chunk at a time with Chan's formula), so the statistics of
+    any number of simulations take constant memory.
+    """
+    
+    __slots__ = ("n", "mean", "M2")
+    
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.M2 = 0.0 #sum of squared deviations from the mean
+        
+    def update(self, chunk):
+        if len(chunk):
+            mean = chunk.mean()
+            self.merge(len(chunk), mean, ((chunk - mean)**2).sum())
+            
+    def merge(self, n, mean, M2):
+        
+        """
+        Adds the statistics of a chunk that was summarized somewhere else (e.g. another process).
+        """
+        
+        if n == 0:
+            return
+        delta = mean - self.mean
+        total = self.n + n
+        self.mean += delta*n/total
+        self.M2 += M2 + delta**2*self.n*n/total
+        self.n = total
+        
+    @property
+    def std(self):
+        return np.sqrt(self.M2/self.n) if self.n else np.nan #same as np.std of all the simulations
+    
+    def half_width(self):
+        
+        """
+        95% confidence half width of the simulated average and of the 1.95 STDEV uncertainty (the larger of the two),
+        shrinks like 1/sqrt(n).
+        """
+        
+        return 1.96*max(1, 1.95/np.sqrt(2))*self.std/np.sqrt(self.n)
+
+
+def _adaptive_mc(draw, chunk_size, tol, max_sims, callback = None, keep = False):
+    
+    """
+    Runs draw(chunk_size) until the 95% confidence half width of the results is at most tol or max_sims simulations are done.
+    
+    Returns:
+        the _RunningStats of the results and a list of the chunks if keep, otherwise None.
+    """
+    
+    stats = _RunningStats()
+    chunks = [] if keep else None
+    
+    while stats.n < max_sims:
+        chunk = draw(min(chunk_size, max_sims - stats.n))
+        stats.update(chunk)
+        if keep:
+            chunks += [chunk]
+        converged = stats.n > 1 and stats.half_width() <= tol
+        if callback is not None:
+            callback(1.0 if converged else stats.n/max_sims)
+        if converged:
+            break
+        
+    return stats, chunks
+
+
+MC_BLOCK = 100000 #simulations per block in the parallel Monte Carlo, fixed so results do not depend on the number of workers
+
+
+def _seed_sequence(seed):
+    
+    """
+    SeedSequence the parallel Monte Carlo spawns one independent random stream per block from.
+    """
+    
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(int(seed.integers(2**63)))
+    
+    return np.random.SeedSequence(seed)
+
+
+def _summarize_block(results, keep):
+    
+    """
+    What a worker sends back for one block: its size, mean and sum of squared deviations, and the results if they are kept.
+    """
+    
+    mean = results.mean() if len(results) else 0.0
+    
+    return len(results), mean, ((results - mean)**2).sum(), results if keep else None
+
+
+def _mc_block(seed, n, x, y, U_x, U_y, slope, keep, sampler = "random"):
+    
+    """
+    One block of getMonteCarlo simulations with its own random stream, runs in a worker process.
+    """
+    
+    calc = _mc_slopes if slope else _mc_integrals
+    rng = np.random.default_rng(seed)
+    
+    return _summarize_block(_mc_draw(x, y, U_x, U_y, n, rng, calc, _make_sampler(sampler, 2*len(x), rng)), keep)
+
+
+def _parallel_mc(block, args, block_size, total, seed, workers, tol = None, callback = None, keep = False):
+    
+    """
+    Splits total simulations into blocks of block_size and runs them across a process pool. Block i always gets the i-th
+    SeedSequence child of seed and the blocks are merged in order, so for a given seed the result is bit for bit the same no
+    matter how many workers there are. With tol, blocks are merged one at a time and the run stops at the first block where the
+    95% confidence half width is at most tol (blocks computed past that point are thrown away).
+    
+    Parameters:
+        block: function
+            top level function called as block(seed, n, *args) that returns _summarize_block of n simulations.
+        workers: int
+            number of processes, 1 runs the blocks in this process.
+            
+    Returns:
+        the _RunningStats of all the merged blocks and their results if keep, otherwise None.
+    """
+    
+    seeds = _seed_sequence(seed)
+    sizes = [min(block_size, total - start) for start in range(0, total, block_size)]
+    batch = len(sizes) if tol is None else max(workers, 1) #blocks sent to the pool at a time
+    stats = _RunningStats()
+    chunks = [] if keep else None
+    
+    with (ProcessPoolExecutor(max_workers = workers) if workers > 1 else nullcontext()) as pool:
+        mapper = pool.map if pool is not None else map
+        for first in range(0, len(sizes), batch):
+            n = sizes[first:first + batch]
+            children = seeds.spawn(len(n)) #spawning in batches gives the same children as spawning them all at once
+            converged = False
+            for count, mean, M2, results in mapper(block, children, n, *[[arg]*len(n) for arg in args]):
+                stats.merge(count, mean, M2)
+                if keep:
+                    chunks += [results]
+                converged = tol is not None and stats.n > 1 and stats.half_width() <= tol
+                if callback is not None:
+                    callback(1.0 if converged else stats.n/total)
+                if converged:
+                    break
+            if converged:
+                break
+            
+    return stats, chunks
+
+
+@Profiler.profiled("getMonteCarlo", count = "num_sims")
+def getMonteCarlo(x, y, U_x, U_y, num_sims = 4000, slope = False, integral = False, seed = None, callback = None, tol = None,
+                  max_sims = 10**7, workers = None, sampler = "random"):
     
     """
     Calculates uncertainty of a linear regression or numerical integration using the Monte Carlo method (buncha random simulations).
+    All of the simulations are drawn and evaluated as numpy batches, so 1e6 simulations are practical.
     
     Parameters: 
         x: list or numpy array
@@ -114,176 +616,1299 @@ def getMonteCarlo(x, y, U_x, U_y, num_sims = 4000, slope = False, integral = Fal
             if chosen the function will return a linear regression and its respective uncertainty.
         integral: bool
             if chosen the function will return a numerical integral (simpsons rule) and its respective uncertainty.
+        seed: int or numpy.random.Generator, optional
+            seeds the random draws so results can be reproduced.
+        callback: function, optional
+            called with the fraction of simulations done as they run, for progress bars. It may raise an exception to stop early.
+        tol: float, optional
+            adaptive mode. Simulations are run num_sims at a time, keeping only a running mean and variance, until the 95%
+            confidence half width of both the average and the uncertainty is at most tol (same units as the result).
+        max_sims: int, optional
+            most simulations the adaptive mode may run.
+        workers: int, optional
+            parallel mode. The simulations are split into blocks of MC_BLOCK (num_sims in adaptive mode) that run across this
+            many processes, each block with its own random stream spawned from seed. For a given seed the result is the same for
+            any number of workers, and without workers too (a seeded run always uses the blocks). On Windows, call it from under
+            if __name__ == "__main__".
+        sampler: str, optional
+            "random" (pseudo-random), or the low discrepancy "sobol", "halton" or "lhs" (Latin hypercube) that usually reach
+            the same precision with far fewer simulations. See compareSamplers. Sobol points are only balanced in powers of two,
+            so "sobol" rounds the number of simulations up to one.
         
     Returns:
             the average result of the desired calculation from the simulations and its uncertainty.      
     """
     
-    if len(x) != len(y) and len(x) != len(U_x) and len(y) != len(U_y):
+    if len(x) != len(y) or len(x) != len(U_x) or len(y) != len(U_y):
         raise ValueError("Array lengths must be equal length.")
     
-    slopes = []
-    integrals = []
-    
-    x = np.array(x)[None:] #reshapes inputs to be 1D numpy row vectors
-    U_x = np.array(U_x)[None:]
-    y = np.array(y)[None:]
-    U_y = np.array(U_y)[None:]
+    x = np.asarray(x, dtype = float).ravel() #reshapes inputs to be 1D numpy row vectors
+    U_x = np.asarray(U_x, dtype = float).ravel()
+    y = np.asarray(y, dtype = float).ravel()
+    U_y = np.asarray(U_y, dtype = float).ravel()
     
     if not(slope) and not(integral):
         raise ValueError("Must make either slope or integral True.")
     elif slope and integral:
         raise ValueError("Cannot have both integral and slope True.")
         
-    if slope: 
-        for j in range(num_sims):
-                #calculates alternative values for x and y using the inverse cumulative distribution function
-                #where the probabiltiy is random, the mean is the data points, and the uncertainty is assumed to be two STDEVS.
-                x_mc = norm.ppf(random.uniform(0,1), loc = x, scale = U_x/2) 
-                y_mc = norm.ppf(random.uniform(0,1), loc = y, scale = U_y/2)
-                slopes += [sp.stats.linregress(x_mc,y_mc)[0]] #creating a list of slopes for each simulation
-        avg = np.mean(slopes)
-        CI = 1.95*np.std(slopes) #95% confidence interval assuming an infinite set
-        
-    if integral: 
-        for j in range(num_sims): #similar to above except for an integral
-                x_mc = norm.ppf(random.uniform(0,1), loc = x, scale = U_x/2)
-                y_mc = norm.ppf(random.uniform(0,1), loc = y, scale = U_y/2)
-                integrals += [sp.integrate.simpson(y_mc, x_mc)]
-        avg = np.mean(integrals)
-        CI = 1.95*np.std(integrals) #95% CI for infinite set
+    num_sims, max_sims, block = _sobol_sizes(sampler, num_sims, max_sims)
+    
+    if workers is not None or seed is not None: #seeded runs always use the blocks, so workers does not change the result
+        block_size, total = (num_sims, max_sims) if tol is not None else (block, num_sims)
+        stats, _ = _parallel_mc(_mc_block, (x, y, U_x, U_y, slope, False, sampler), block_size, total, seed, workers or 1, tol,
+                                callback)
+        return(stats.mean, 1.95*stats.std)
+    
+    rng = np.random.default_rng(seed)
+    draws = _make_sampler(sampler, 2*len(x), rng)
+    
+    if tol is not None:
+        calc = _mc_slopes if slope else _mc_integrals
+        stats, _ = _adaptive_mc(lambda n: _mc_draw(x, y, U_x, U_y, n, rng, calc, draws), num_sims, tol, max_sims, callback)
+        return(stats.mean, 1.95*stats.std)
+    
+    results = _mc_batch(x, y, U_x, U_y, num_sims, rng, slope = slope, chunk_size = block, callback = callback, sampler = draws) #list of slopes or integrals for each simulation
+    
+    avg = np.mean(results)
+    CI = 1.95*np.std(results) #95% confidence interval assuming an infinite set
     
     return(avg, CI)
 
 
-def getStressStrain(filename, area, mass = 1, volume = 1, MC_sim = False):
+class _StressStrainAccumulator:
     
     """
-    Takes data from a UTM and generates stress, strain, and various material properties.
-    
-    Parameters: 
-        filename: str, csv file. 
-        area: float
-            cross sectional area of testing specimen
-        mass: float
-            used to calculate any specific properties
-        volume: float
-            used to calculate various material properties
-        MC_sim: bool, optional
-            If the user wants uncertainty in the modulus of elasticty, making this true will make it a returned value.
-    Returns:
-      a dataframe column of stress values, a dataframe column of strain values, modulus of elasticity, uncertainty if MC_sim = True, 
-      yield strength, yield strain, specific modulus, breaking strength, breaking strain, specific strength, ultimate strength, ultimate
-      strain
+    Online accumulators for the stress strain properties. Chunks of (strain, stress) are fed in file order and only running sums
+    for the elastic linear regression, the running maximum, the last elastic point and the last two rows are kept, so memory
+    does not grow with the length of the test.
     """
     
-    df = pd.read_csv(filename).dropna(axis = 1).drop(0, axis = 0) #second row usually has units, so it is removed
-    row_vals = list(df.iloc[5]) #Pulling a row in the dataframe to ascertain which columns are strain or load.
-
-    load_col = row_vals.index(max(row_vals))
-    strain_col = row_vals.index(min(row_vals))
-    
-    #to prevent errors with the number types when reading the csv, turn the df into np arrays first and forcibly remove errors
-    data = df.copy()[pd.to_numeric(df.iloc[:,load_col],errors='coerce') >= 0] #removing all negative loads
-    data["strain"] = pd.to_numeric(data.iloc[:,strain_col],errors='coerce') 
-    data["stress"] = pd.to_numeric(data.iloc[:,load_col],errors='coerce').div(area)
-
-    e_y = .2/100 #for the .2% yield strength method
+    __slots__ = ("e_y", "n", "x0", "y0", "Sx", "Sy", "Sxx", "Sxy", "yield_point", "ultimate", "tail")
     
-    data_elastic = data.copy()[data["strain"] <= e_y] #split the data into plastic and elastic
-    data_plastic = data.copy()[data["strain"] > e_y]
-    
-    E = sp.stats.linregress(data_elastic["strain"], data_elastic["stress"])[0]
+    def __init__(self, e_y = .2/100):
+        self.e_y = e_y
+        self.n = 0
+        self.x0 = self.y0 = 0.0 #first elastic point, sums are taken relative to it to keep them well conditioned
+        self.Sx = self.Sy = self.Sxx = self.Sxy = 0.0
+        self.yield_point = (np.nan, np.nan) #(stress, strain) of the last elastic point
+        self.ultimate = (-np.inf, np.nan) #(stress, strain) of the maximum stress
+        self.tail = np.empty((0, 2)) #last two (stress, strain) rows
+        
+    def update(self, strain, stress):
+        
+        """
+        Adds a chunk of numpy strain and stress values (negative loads already removed).
+        """
+        
+        elastic = strain <= self.e_y
+        if elastic.any():
+            x, y = strain[elastic], stress[elastic]
+            if self.n == 0:
+                self.x0, self.y0 = x[0], y[0]
+            dx, dy = x - self.x0, y - self.y0
+            self.n += len(x)
+            self.Sx += dx.sum()
+            self.Sy += dy.sum()
+            self.Sxx += (dx*dx).sum()
+            self.Sxy += (dx*dy).sum()
+            self.yield_point = (y[-1], x[-1])
+            
+        if len(stress):
+            i = np.argmax(stress) #first occurrence, so an equal maximum in a later chunk does not replace it
+            if stress[i] > self.ultimate[0]:
+                self.ultimate = (stress[i], strain[i])
+            self.tail = np.vstack([self.tail, np.column_stack([stress[-2:], strain[-2:]])])[-2:]
+            
+    @property
+    def modulus(self):
+        denominator = self.n*self.Sxx - self.Sx**2
+        if self.n < 2 or denominator == 0: #no line through the elastic points yet
+            return np.nan
+        return (self.n*self.Sxy - self.Sx*self.Sy)/denominator #least squares slope from the running sums
     
-    Sigma_y = data_elastic["stress"].iloc[-1]
-    Strain_y = data_elastic["strain"].iloc[-1]
+    @property
+    def breaking(self):
+        return tuple(self.tail[0]) if len(self.tail) else (np.nan, np.nan) #second to last row, same as getStressStrain
+
+
+def _detect_columns(filename):
     
-    dens = mass/volume #density
-    SM = E/dens #specific stiffness
+    """
+    Reads only the first rows of a UTM csv (a file name or an open file) and returns the names of the load and strain columns.
+    """
     
-    Sigma_b = data["stress"].iloc[-2] #last value of the stress strain curve 
-    Strain_b = data["strain"].iloc[data.index[data['stress'] == Sigma_b].tolist()[0]] #corresponding strain by matching index
+    head = pd.read_csv(filename, nrows = 7).dropna(axis = 1)
+    if len(head) < 7:
+        raise ValueError("The UTM file needs at least 6 rows of data after the units to find its load and strain columns")
+    head = head.drop(0, axis = 0) #second row usually has units, so it is removed
+    row_vals = list(head.iloc[5]) #same row getStressStrain uses to ascertain which columns are strain or load.
     
-    S = Sigma_b/dens #specific strength   
+    return head.columns[row_vals.index(max(row_vals))], head.columns[row_vals.index(min(row_vals))]
+
+
+@Profiler.profiled("stream UTM")
+def _streamStressStrain(filename, area, mass, volume, chunksize):
     
-    Sigma_U = data["stress"].max() #finds maximum value
-    Strain_U = data["strain"].iloc[data.index[data['stress'] == Sigma_U].tolist()[0]] #corresponding strain by matching index
-                    
+    """
+    Chunked version of getStressStrain, see its docstring. Only the load and strain columns are read and each chunk is discarded
+    after it updates the accumulators, so peak memory is bounded by chunksize.
+    """
     
+    load_name, strain_name = _detect_columns(filename)
+    acc = _StressStrainAccumulator()
     
-    if MC_sim:
-        indices = np.round(np.linspace(10,len(data_elastic)-10,5)).astype(int)#takes 5 equally spaced points in elastic region to find slope
-        x = [] 
-        y = []
-        U_x = []
-        U_y = []
+    for chunk in pd.read_csv(filename, usecols = [load_name, strain_name], skiprows = [1], chunksize = chunksize):
+        load = pd.to_numeric(chunk[load_name], errors = 'coerce').to_numpy(dtype = float)
+        strain = pd.to_numeric(chunk[strain_name], errors = 'coerce').to_numpy(dtype = float)
+        keep = load >= 0 #removing all negative loads
+        acc.update(strain[keep], load[keep]/area)
+        
+    return _accumulatorResult(acc, mass, volume)
 
-        for i in indices:
-            x += [data_elastic["strain"][i]]
-            y += [data_elastic["stress"][i]]
-            U_x += [data_elastic["strain"][i]*.5/100] #assumes a .5% uncertainty for load cell and extensometer
-            U_y += [data_elastic["stress"][i]*.5/100]
 
+def _accumulatorResult(acc, mass, volume):
+    result = StressStrainResult(None, None, mass, volume) #no curve is kept, every property is already known
+    result._E = acc.modulus/1000
+    result._yield_point = acc.yield_point
+    result._breaking_point = acc.breaking
+    result._ultimate_point = acc.ultimate if np.isfinite(acc.ultimate[0]) else (np.nan, np.nan) #no rows yet
+    return result
 
-        slope, uncert = getMonteCarlo(x, y ,U_x ,U_y, slope = True) #returns E and uncertainty of E
 
-        return data["stress"], data["strain"], slope/1000, uncert/1000, Sigma_y, Strain_y, SM, Sigma_b, Strain_b, S, Sigma_U, Strain_U
-    else:
-        return E/1000,Sigma_y, SM, S, Sigma_U, data["stress"], data["strain"] , Strain_y, Sigma_b, Strain_b, Strain_U
-    
-def MonteCarlo(expr, N = 10000,  **kwargs):
+class LiveStressStrain:
     
     """
-    Calculates propagated error using the Monte Carlo method, does not work for large uncertainties.
+    Follows the csv a UTM is still writing. Every poll reads only the bytes appended since the last one, parses the complete
+    new rows and feeds them to the same online accumulators as getStressStrain(chunksize = ...), so the properties are up to date
+    without reading the file again. A partly written last line is kept until the rest of it arrives.
     
     Parameters:
-        expr: sympy_object, string
+        filename: str, csv file being written.
+        area, mass, volume: float
+            same as getStressStrain.
+            
+    Example:
+        live = LiveStressStrain("test.csv", 41.93)
+        while testing:
+            strain, stress = live.poll() #the new points
+            print(live.result().E)
+    """
+    
+    def __init__(self, filename, area, mass = 1, volume = 1):
+        self.filename = filename
+        self.area = area
+        self.mass = mass
+        self.volume = volume
+        self.reset()
+        
+    def reset(self):
+        """Starts over from the beginning of the file, e.g. when the machine starts a new test in it."""
+        self.acc = _StressStrainAccumulator()
+        self.columns = None #positions of the load and strain columns, found once the first rows are written
+        self.offset = 0 #bytes read so far
+        self.rows = 0
+        self.partial = b""
+        
+    def _start(self):
+        
+        """
+        Finds the load and strain columns and where the data starts, once the file has enough rows to tell. Returns False before.
+        """
+        
+        with open(self.filename, "rb") as f:
+            head = f.read(1 << 16)
+        head = head[:head.rfind(b"\n") + 1] #a half written row would look like a row without load and strain
+        try:
+            load_name, strain_name = _detect_columns(io.BytesIO(head))
+            rows = pd.read_csv(io.BytesIO(head), skiprows = [1])
+        except (IndexError, KeyError, ValueError, pd.errors.EmptyDataError): #not enough rows written yet
+            return False
+        if rows[[load_name, strain_name]].apply(pd.to_numeric, errors = 'coerce').isna().all().any():
+            return False
+        
+        names = list(rows.columns)
+        first = head.find(b"\n") + 1 #after the column names
+        self.offset = head.find(b"\n", first) + 1 #and the units
+        self.columns = [names.index(load_name), names.index(strain_name)]
+        
+        return True
+    
+    def poll(self):
+        
+        """
+        Reads the rows appended since the last poll and updates the properties.
+        
+        Returns:
+            numpy arrays of the strain and stress of the new rows (negative loads removed), empty if nothing new was written.
+        """
+        
+        empty = np.empty(0), np.empty(0)
+        if not os.path.exists(self.filename):
+            return empty
+        if os.path.getsize(self.filename) < self.offset: #the file was replaced
+            self.reset()
+        if self.columns is None and not self._start():
+            return empty
+        
+        with open(self.filename, "rb") as f:
+            f.seek(self.offset)
+            new = f.read()
+        self.offset += len(new)
+        text = self.partial + new
+        end = text.rfind(b"\n") + 1
+        text, self.partial = text[:end], text[end:]
+        if not text.strip():
+            return empty
+        
+        rows = pd.read_csv(io.BytesIO(text), header = None, usecols = self.columns, skip_blank_lines = True)
+        load = pd.to_numeric(rows[self.columns[0]], errors = 'coerce').to_numpy(dtype = float)
+        strain = pd.to_numeric(rows[self.columns[1]], errors = 'coerce').to_numpy(dtype = float)
+        keep = load >= 0 #removing all negative loads
+        strain, stress = strain[keep], load[keep]/self.area
+        self.acc.update(strain, stress)
+        self.rows += len(strain)
+        
+        return strain, stress
+    
+    def result(self):
+        """StressStrainResult of the rows read so far."""
+        return _accumulatorResult(self.acc, self.mass, self.volume)
+
+
+_UTM_cache = OrderedDict() #(path, size, mtime) -> (strain, load), least recently used first
+_UTM_cache_lock = threading.Lock()
+
+
+def _parseUTM(filename, dtype = np.float64):
+    
+    """
+    Parses a UTM csv into contiguous numpy arrays of strain and load of the given dtype, with the negative loads removed. Only
+    the load and strain columns are read, and without the units row pandas parses them straight to numbers.
+    """
+    
+    load_name, strain_name = _detect_columns(filename)
+    with Profiler.span("read_csv") as span:
+        df = pd.read_csv(filename, usecols = [load_name, strain_name], skiprows = [1]) #second row usually has units
+        span.count = len(df)
+    
+    #to prevent errors with the number types when reading the csv, turn the df into np arrays first and forcibly remove errors
+    with Profiler.span("to_numeric", len(df)):
+        load = pd.to_numeric(df[load_name], errors = 'coerce').to_numpy(dtype = dtype)
+        strain = pd.to_numeric(df[strain_name], errors = 'coerce').to_numpy(dtype = dtype)
+    keep = load >= 0 #removing all negative loads
+    if keep.all():
+        return np.ascontiguousarray(strain), np.ascontiguousarray(load)
+    
+    return strain[keep], load[keep]
+
+
+def _hashUTM(filename):
+    
+    """
+    Content hash of a file, names its .npz in UTM_CACHE_DIR.
+    """
+    
+    digest = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            digest.update(block)
+            
+    return digest.hexdigest()
+
+
+def _loadUTM(filename, dtype = np.float64):
+    
+    """
+    Parse-once layer under getStressStrain. Returns the (strain, load) arrays of a UTM csv, from the in-memory cache if the file
+    has not changed (same path, size and modification time), then from UTM_CACHE_DIR by content hash, and only then by parsing.
+    The returned arrays are read only since they are shared between calls. Each dtype is cached separately.
+    """
+    
+    dtype = np.dtype(dtype)
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, dtype.str)
+    
+    with _UTM_cache_lock:
+        if key in _UTM_cache:
+            _UTM_cache.move_to_end(key)
+            return _UTM_cache[key]
+    
+    npz = None
+    if UTM_CACHE_DIR is not None:
+        suffix = ".npz" if dtype == np.float64 else f".{dtype.name}.npz"
+        npz = os.path.join(UTM_CACHE_DIR, _hashUTM(filename) + suffix)
+        
+    if npz is not None and os.path.exists(npz):
+        with np.load(npz) as cached:
+            strain, load = cached["strain"], cached["load"]
+    else:
+        strain, load = _parseUTM(filename, dtype)
+        if npz is not None:
+            os.makedirs(UTM_CACHE_DIR, exist_ok = True)
+            #written under a temporary name, unique per process and thread, so a half written file is never loaded
+            tmp = npz + f".{os.getpid()}.{threading.get_ident()}.tmp.npz"
+            np.savez(tmp, strain = strain, load = load)
+            os.replace(tmp, npz)
+            
+    strain.flags.writeable = False
+    load.flags.writeable = False
+    
+    with _UTM_cache_lock:
+        _UTM_cache[key] = (strain, load)
+        while len(_UTM_cache) > 1 and sum(a.nbytes + b.nbytes for a, b in _UTM_cache.values()) > UTM_CACHE_MAX_BYTES:
+            _UTM_cache.popitem(last = False) #drops the least recently used file
+            
+    return strain, load
+
+
+def clearUTMCache():
+    
+    """
+    Empties the in-memory cache of parsed UTM files. Files in UTM_CACHE_DIR are left alone.
+    """
+    
+    with _UTM_cache_lock:
+        _UTM_cache.clear()
+
+
+def _window_fits(sums, start, stop):
+    
+    """
+    Least squares lines of the windows [start, stop) of a curve from the prefix sums of _prefix_sums, each in O(1).
+    
+    Returns:
+        arrays of the slopes, intercepts and R squared of the windows (nan where the strain does not change).
+    """
+    
+    cx, cy, cxx, cxy, cyy, x0, y0 = sums
+    n = stop - start
+    Sx, Sy = cx[stop] - cx[start], cy[stop] - cy[start]
+    Sxx = cxx[stop] - cxx[start] - Sx**2/n
+    Sxy = cxy[stop] - cxy[start] - Sx*Sy/n
+    Syy = cyy[stop] - cyy[start] - Sy**2/n
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        slope = np.where(Sxx > 0, Sxy/Sxx, np.nan)
+        r2 = np.where((Sxx > 0) & (Syy > 0), Sxy**2/(Sxx*Syy), np.nan)
+        intercept = y0 + (Sy - slope*Sx)/n - slope*x0
+    
+    return slope, intercept, r2
+
+
+def _prefix_sums(strain, stress):
+    x0, y0 = strain.mean(), stress.mean() #centering keeps the differences of large sums accurate
+    x, y = strain - x0, stress - y0
+    sums = np.zeros((5, len(x) + 1))
+    for row, v in zip(sums, (x, y, x*x, x*y, y*y)):
+        np.cumsum(v, out = row[1:])
+    return tuple(sums) + (x0, y0)
+
+
+@Profiler.profiled("findElasticRegion")
+def findElasticRegion(strain, stress, window = None, min_r2 = .995, tolerance = 4):
+    
+    """
+    Finds the linear elastic region of a stress strain curve in O(n). With prefix sums every window's linear regression costs O(1),
+    so all windows of a fixed length are fitted at once. The steepest window with an R squared of at least min_r2 is the seed
+    (the toe region and the plastic region are both less steep), and it is grown both ways for as long as the points stay within
+    tolerance times its scatter of its line.
+    
+    Parameters:
+        strain, stress: numpy arrays
+        window: int, optional
+            number of points in the seed windows, .5% of the curve (at least 5 points) by default.
+        min_r2: float, optional
+            the lowest R squared counted as linear.
+        tolerance: float, optional
+            how many standard deviations of the seed's residuals a point may be from its line and still be elastic.
+            
+    Returns:
+        start and stop indices of the elastic region, so strain[start:stop] is elastic.
+    """
+    
+    strain = np.asarray(strain, dtype = float)
+    stress = np.asarray(stress, dtype = float)
+    n = len(strain)
+    w = min(n, window or max(5, n//200))
+    sums = _prefix_sums(strain, stress)
+    
+    starts = np.arange(n - w + 1)
+    slope, _, r2 = _window_fits(sums, starts, starts + w)
+    linear = r2 >= min_r2
+    if not linear.any(): #nothing is that straight, so use the straightest windows
+        linear = r2 >= np.nanmax(r2)
+    start = int(np.argmax(np.where(linear, slope, -np.inf)))
+    stop = start + w
+    
+    #grow the seed both ways until most points of a window are further from its line than the scatter inside the seed allows,
+    #so single spikes do not end the region
+    slope, intercept, r2 = _window_fits(sums, start, stop)
+    Syy = sums[4][stop] - sums[4][start] - (sums[1][stop] - sums[1][start])**2/w
+    scatter = np.sqrt(max(Syy*(1 - r2), 0)/max(w - 2, 1))
+    steps = np.diff(strain[start:stop])
+    steps = steps[steps > 0]
+    if len(steps): #a seed that happens to sit on the strain resolution grid looks straighter than the curve is
+        scatter = max(scatter, slope*steps.min())
+    off = np.abs(stress - (slope*strain + intercept)) > tolerance*scatter
+    count = np.concatenate(([0], np.cumsum(off)))
+    leaving = np.flatnonzero(count[w:] - count[:-w] > w//2) #windows [j, j + w) that are mostly off the line
+    after = leaving[leaving >= stop - w//2]
+    if len(after):
+        j = after[0]
+        stop = max(stop, int(j + np.argmax(off[j:j + w])))
+    else:
+        stop = n
+    before = leaving[leaving + w <= start + w//2]
+    if len(before):
+        j = before[-1]
+        start = min(start, int(j + w - np.argmax(off[j:j + w][::-1])))
+    else:
+        start = 0
+    
+    return start, stop
+
+
+def offsetYield(strain, stress, E, intercept = 0, offset = .2/100, start = 0):
+    
+    """
+    Yield point by the offset method: where the curve crosses the elastic line shifted by offset strain. The crossing is found with
+    a vectorized search for the sign change of the curve minus the line, and linearly interpolated between the two points around it.
+    
+    Parameters:
+        strain, stress: numpy arrays
+        E: float
+            slope of the elastic line, in stress per strain (MPa, not GPa).
+        intercept: float, optional
+            stress intercept of the elastic line, which moves the offset line with the toe region.
+        offset: float, optional
+            .2% by default.
+        start: int, optional
+            index to start searching from, e.g. the start of the elastic region.
+            
+    Returns:
+        yield strength and yield strain, nan if the curve never crosses the offset line.
+    """
+    
+    strain = np.asarray(strain, dtype = float)[start:]
+    stress = np.asarray(stress, dtype = float)[start:]
+    above = stress - (E*(strain - offset) + intercept)
+    crossings = np.flatnonzero((above[:-1] > 0) & (above[1:] <= 0))
+    if len(crossings) == 0:
+        return np.nan, np.nan
+    
+    i = crossings[0]
+    t = above[i]/(above[i] - above[i + 1])
+    
+    return stress[i] + t*(stress[i + 1] - stress[i]), strain[i] + t*(strain[i + 1] - strain[i])
+
+
+def decimateCurve(x, y, buckets = 1000, keep = (), xlim = None):
+    
+    """
+    Picks the points of a long curve worth plotting. The curve is split into buckets of consecutive points and only the first,
+    lowest, highest and last point of each bucket are kept, so a line through them looks the same as the full curve at about one
+    bucket per pixel, however many points there are. The peaks are always exact.
+    
+    Parameters:
+        x, y: numpy arrays
+        buckets: int, optional
+            number of buckets, e.g. the width of the plot in pixels.
+        keep: list of int, optional
+            indices that are always kept, like the ultimate and breaking points.
+        xlim: tuple, optional
+            (left, right) x limits of a zoomed view. Only the points inside it (and the one on each side so the line reaches
+            the edges) are decimated, so zooming in shows more detail.
+            
+    Returns:
+        sorted array of the indices to plot, use as x[indices], y[indices].
+    """
+    
+    y = np.asarray(y)
+    start, stop = 0, len(y)
+    if xlim is not None:
+        x = np.asarray(x)
+        inside = np.flatnonzero((x >= min(xlim)) & (x <= max(xlim)))
+        if len(inside):
+            start, stop = max(inside[0] - 1, 0), min(inside[-1] + 2, len(y))
+    n = stop - start
+    keep = np.asarray(keep, dtype = int).reshape(-1)
+    keep = keep[(keep >= start) & (keep < stop)]
+    
+    if n <= 4*buckets:
+        return np.union1d(np.arange(start, stop), keep)
+    
+    size = -(-n//buckets) #points per bucket, rounded up
+    padded = np.empty(size*buckets)
+    padded[:n] = y[start:stop]
+    padded[n:] = y[stop - 1] #the last bucket is padded with its last point, argmin and argmax still find real points
+    padded = padded.reshape(buckets, size)
+    firsts = np.arange(buckets)*size
+    indices = np.concatenate((firsts, firsts + np.argmin(padded, axis = 1), firsts + np.argmax(padded, axis = 1), 
+                              np.minimum(firsts + size - 1, n - 1)))
+    
+    return np.union1d(np.minimum(indices, n - 1) + start, keep)
+
+
+@Profiler.profiled("getCurveMonteCarlo", count = "num_sims")
+def getCurveMonteCarlo(stress, strain, mass = 1, volume = 1, U_load = .5/100, U_strain = .5/100, U_area = 0, U_mass = 0, U_volume = 0,
+                       num_sims = 1000, seed = None, e_y = .2/100, max_elements = 4*10**6, noise_load = 0, noise_strain = 0,
+                       elastic_region = "fixed"):
+    
+    """
+    Monte Carlo uncertainty of every stress strain property. The load cell and extensometer uncertainties are calibration errors:
+    each simulation draws one gain for all the loads and one for all the strains of the curve, as well as the area, mass and
+    volume (two STDEVs, as fractions of the value). The elastic region is the same readings of the nominal curve in every
+    simulation, and the yield point is its last reading ("fixed") or the e_y offset yield of each simulated curve ("auto").
+    
+    A gain scales every property of the curve without moving its peaks, so without noise each simulation is the nominal
+    properties times its gains and the curve is never copied. With noise every simulated curve is built and all the properties
+    of a batch of simulations are recalculated at once with numpy along the batch axis, the ultimate and breaking points being
+    found again in each.
+    
+    Parameters:
+        stress, strain: numpy arrays
+            the stress strain curve, e.g. from getStressStrain.
+        mass, volume: float, optional
+            used for the specific properties.
+        U_load, U_strain, U_area, U_mass, U_volume: float, optional
+            relative uncertainties, .5% for the load cell and extensometer by default.
+        noise_load, noise_strain: float, optional
+            relative noise of every single reading (two STDEVs), independent from point to point and 0 by default. The curve
+            already contains the real noise, so noise added on top of it makes the ultimate strength (the largest of the noisy
+            stresses) come out biased high.
+        num_sims: int, optional
+            number of simulations.
+        seed: int or numpy.random.Generator, optional
+            seeds the random draws so results can be reproduced.
+        max_elements: int, optional
+            with noise, simulations are run in batches of at most this many perturbed points to bound memory.
+        elastic_region: str or tuple, optional
+            "fixed" or "auto" like getStressStrain, or the (start, stop) of an elastic region already found by findElasticRegion,
+            which then also uses the offset yield.
+            
+    Returns:
+        a DataFrame with a row per property (E in GPa, stresses in MPa) and its nominal value, mean, standard deviation,
+        uncertainty (1.95 STDEVs like the other Monte Carlo functions) and 2.5th and 97.5th percentiles over the simulations.
+    """
+    
+    stress = np.asarray(stress, dtype = float)
+    strain = np.asarray(strain, dtype = float)
+    nominal = StressStrainResult(stress, strain, mass, volume, e_y = e_y, elastic_region = "fixed" if elastic_region == "fixed" else "auto")
+    if not isinstance(elastic_region, str):
+        nominal._elastic_slice = tuple(elastic_region)
+    offset = nominal.elastic_region == "auto"
+    elastic = nominal.elastic_index #readings of the elastic region, the same in every simulation
+    if len(nominal.elastic[0]) < 2:
+        raise ValueError(f"The curve needs at least two points with a strain up to e_y = {e_y} for the elastic region.")
+    i_y = np.arange(len(strain))[elastic][-1] #last elastic point
+    first = np.arange(len(strain))[elastic][0] #offset yield is searched for from here
+    
+    rng = np.random.default_rng(seed)
+    dens = mass/volume
+    n_points = len(stress)
+    noise = bool(noise_load or noise_strain)
+    batch = max(1, min(num_sims, max_elements//max(n_points, 1))) if noise else num_sims
+    sims = {name: np.empty(num_sims) for name in _batch_properties}
+    
+    for start in range(0, num_sims, batch):
+        n = min(batch, num_sims - start)
+        strain_gain = 1 + U_strain/2*rng.standard_normal(n)
+        load_gain = (1 + U_load/2*rng.standard_normal(n))/(1 + U_area/2*rng.standard_normal(n)) #stress is load/area
+        dens_mc = dens*(1 + U_mass/2*rng.standard_normal(n))/(1 + U_volume/2*rng.standard_normal(n))
+        
+        if noise:
+            strain_mc = strain*(strain_gain[:,None] + noise_strain/2*rng.standard_normal((n, n_points)))
+            stress_mc = stress*(load_gain[:,None] + noise_load/2*rng.standard_normal((n, n_points)))
+            
+            #linear regression of every simulation's elastic region at once
+            x = strain_mc[:, elastic]
+            y = stress_mc[:, elastic]
+            x_dev = x - x.mean(axis = 1, keepdims = True)
+            E = (x_dev*(y - y.mean(axis = 1, keepdims = True))).sum(axis = 1)/(x_dev**2).sum(axis = 1)
+            
+            r = np.arange(n)
+            i_U = np.argmax(stress_mc, axis = 1)
+            points = {"yield": (stress_mc[:, i_y], strain_mc[:, i_y]), "ultimate": (stress_mc[r, i_U], strain_mc[r, i_U]),
+                      "breaking": (stress_mc[:, -2], strain_mc[:, -2])}
+            if offset:
+                intercept = y.mean(axis = 1) - E*x.mean(axis = 1)
+                points["yield"] = np.array([offsetYield(strain_mc[k], stress_mc[k], E[k], intercept[k], e_y, first) for k in r]).T
+        else:
+            E = nominal.elastic_fit[0]*load_gain/strain_gain #the regression slope scales with the gains
+            points = {name: (point[0]*load_gain, point[1]*strain_gain) for name, point in 
+                      (("yield", (stress[i_y], strain[i_y])), ("ultimate", nominal.ultimate_point), ("breaking", nominal.breaking_point))}
+            if offset:
+                points["yield"] = _gainOffsetYield(strain, stress, *nominal.elastic_fit, e_y, first, load_gain, strain_gain)
+        
+        done = slice(start, start + n)
+        sims["E"][done] = E/1000
+        sims["specific_stiffness"][done] = E/dens_mc
+        for name, (point_stress, point_strain) in points.items():
+            sims[name + "_strength"][done] = point_stress
+            sims[name + "_strain"][done] = point_strain
+        sims["specific_strength"][done] = points["breaking"][0]/dens_mc
+    
+    summary = pd.DataFrame({name: {"nominal": float(getattr(nominal, name)), 
+                                   "mean": np.mean(values), 
+                                   "std": np.std(values), 
+                                   "uncertainty": 1.95*np.std(values),
+                                   "p2.5": np.percentile(values, 2.5), 
+                                   "p97.5": np.percentile(values, 97.5)} for name, values in sims.items()}).T
+    
+    return summary
+
+
+def _gainOffsetYield(strain, stress, E, intercept, offset, start, load_gain, strain_gain):
+    
+    """
+    offsetYield of the curve scaled by every pair of gains at once. Scaling by the gains scales the curve minus the offset line by
+    the load gain and moves the line by E*offset/strain_gain, so the yield is where the residuals of the nominal elastic line first
+    drop below -E*offset/strain_gain, found with a binary search in their running minimum.
+    """
+    
+    residual = stress[start:] - (E*strain[start:] + intercept)
+    shift = E*offset/strain_gain
+    lowest = np.minimum.accumulate(residual[1:])
+    j = np.searchsorted(-lowest, shift) + 1 #first reading on or below the shifted line
+    found = j < len(residual)
+    i = np.where(found, j - 1, 0)
+    j = np.where(found, j, 1)
+    t = (residual[i] + shift)/(residual[i] - residual[j])
+    yield_stress = np.where(found, load_gain*(stress[start + i] + t*(stress[start + j] - stress[start + i])), np.nan)
+    yield_strain = np.where(found, strain_gain*(strain[start + i] + t*(strain[start + j] - strain[start + i])), np.nan)
+    
+    below = residual[0] + shift <= 0 #the curve starts below the line, offsetYield then looks for a later crossing
+    for k in np.flatnonzero(below):
+        yield_stress[k], yield_strain[k] = offsetYield(strain*strain_gain[k], stress*load_gain[k], E*load_gain[k]/strain_gain[k],
+                                                       intercept*load_gain[k], offset, start)
+    
+    return yield_stress, yield_strain
+
+
+class _memoized:
+    
+    """
+    Property of StressStrainResult that is computed on first access and then stored in the slot named "_" + its name.
+    """
+    
+    def __init__(self, method):
+        self.method = method
+        self.slot = "_" + method.__name__
+        self.__doc__ = method.__doc__
+        
+    def __get__(self, obj, owner = None):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.slot)
+        except AttributeError: #slot is still empty, so this is the first access
+            value = self.method(obj)
+            setattr(obj, self.slot, value)
+            return value
+
+
+class StressStrainResult:
+    
+    """
+    Result of getStressStrain. Holds the stress and strain arrays once and computes every material property lazily the first time it
+    is accessed, so asking for only the modulus of elasticity only costs a linear regression. E is in GPa, stresses in MPa.
+    
+    For older code it also indexes and unpacks like the tuples getStressStrain used to return (which order depends on MC_sim), but
+    only the values actually indexed are computed.
+    
+    With elastic_region = "fixed" the elastic region is every point up to e_y strain and the yield point is its last point. With
+    "auto" the region is found with findElasticRegion and the yield point is the e_y offset yield from offsetYield.
+    
+    The curve is two contiguous numpy arrays (float32 if getStressStrain was asked to or had to, to stay within
+    CURVE_MEMORY_BUDGET), and the elastic and plastic regions are views of them whenever the region is one run of points.
+    """
+    
+    __slots__ = ("stress", "strain", "mass", "volume", "MC_sim", "e_y", "elastic_region", "_elastic_slice", "_elastic_index",
+                 "_elastic", "_elastic_fit", "_E", "_E_MC", "_yield_point", "_breaking_point", "_ultimate_point", "_uncertainties")
+    
+    _legacy = ("E", "yield_strength", "specific_stiffness", "specific_strength", "ultimate_strength", "_stress_series",
+               "_strain_series", "yield_strain", "breaking_strength", "breaking_strain", "ultimate_strain")
+    _legacy_MC = ("_stress_series", "_strain_series", "_E_MC_value", "E_uncertainty", "yield_strength", "yield_strain", "specific_stiffness",
+                  "breaking_strength", "breaking_strain", "specific_strength", "ultimate_strength", "ultimate_strain")
+    
+    def __init__(self, stress, strain, mass = 1, volume = 1, MC_sim = False, e_y = .2/100, elastic_region = "fixed"):
+        if elastic_region not in ("fixed", "auto"):
+            raise ValueError('elastic_region must be "fixed" or "auto".')
+        self.stress = stress
+        self.strain = strain
+        self.mass = mass
+        self.volume = volume
+        self.MC_sim = MC_sim
+        self.e_y = e_y #for the .2% yield strength method
+        self.elastic_region = elastic_region
+        
+    @_memoized
+    def elastic_slice(self):
+        """start and stop indices of the elastic region found by findElasticRegion"""
+        return findElasticRegion(self.strain, self.stress)
+        
+    @_memoized
+    def elastic_index(self):
+        """the elastic region as a slice of the curve, or an array of its indices if its points are not all in one run"""
+        if self.elastic_region == "auto":
+            return slice(*self.elastic_slice)
+        elastic = self.strain <= self.e_y #split the data into plastic and elastic
+        n = int(np.count_nonzero(elastic))
+        if elastic[:n].all(): #the usual case, the curve starts elastic and leaves it once
+            return slice(0, n)
+        return np.flatnonzero(elastic)
+        
+    @_memoized
+    def elastic(self):
+        """strain and stress arrays of the elastic region, views of the curve when elastic_index is a slice"""
+        index = self.elastic_index
+        return self.strain[index], self.stress[index]
+    
+    @property
+    def plastic(self):
+        """strain and stress arrays after the elastic region, views of the curve when elastic_index is a slice"""
+        index = self.elastic_index
+        if isinstance(index, slice):
+            return self.strain[index.stop:], self.stress[index.stop:]
+        plastic = np.ones(len(self.strain), dtype = bool)
+        plastic[index] = False
+        return self.strain[plastic], self.stress[plastic]
+    
+    @property
+    def nbytes(self):
+        """memory taken by the curve arrays"""
+        return sum(a.nbytes for a in (self.stress, self.strain) if a is not None)
+    
+    @_memoized
+    def elastic_fit(self):
+        """slope (MPa) and intercept of the linear regression of the elastic region"""
+        strain_elastic, stress_elastic = self.elastic
+        with Profiler.span("regression", len(strain_elastic)):
+            fit = sp.stats.linregress(strain_elastic.astype(float), stress_elastic.astype(float)) #float64 even for float32 curves
+        return fit[0], fit[1]
+    
+    @_memoized
+    def E(self):
+        """modulus of elasticity in GPa, from a linear regression of the elastic region"""
+        return self.elastic_fit[0]/1000
+    
+    @_memoized
+    def E_MC(self):
+        """modulus of elasticity (mean of the simulations) and its uncertainty in GPa, from the Monte Carlo simulation of the
+        whole curve in uncertainties (.5% for the load cell and extensometer)"""
+        E = self.uncertainties.loc["E"]
+        return E["mean"], E["uncertainty"]
+    
+    @property
+    def E_uncertainty(self):
+        return self.E_MC[1]
+    
+    @_memoized
+    def uncertainties(self):
+        """Monte Carlo uncertainty of every property from getCurveMonteCarlo with its default instrument uncertainties"""
+        return self.curveMonteCarlo()
+    
+    def curveMonteCarlo(self, **kwargs):
+        """getCurveMonteCarlo of this curve with the same elastic region and yield method, kwargs are passed on to it."""
+        if self.stress is None:
+            raise ValueError("The curve of a streamed file is not kept, so it cannot be simulated.")
+        region = self.elastic_slice if self.elastic_region == "auto" else "fixed"
+        return getCurveMonteCarlo(self.stress, self.strain, self.mass, self.volume, e_y = self.e_y, elastic_region = region, **kwargs)
+    
+    @property
+    def _E_MC_value(self):
+        return self.E_MC[0]
+    
+    @_memoized
+    def yield_point(self):
+        """stress and strain of the last point in the elastic region, or of the offset yield"""
+        if self.elastic_region == "auto":
+            return offsetYield(self.strain, self.stress, *self.elastic_fit, offset = self.e_y, start = self.elastic_slice[0])
+        strain_elastic, stress_elastic = self.elastic
+        return stress_elastic[-1], strain_elastic[-1]
+    
+    @_memoized
+    def breaking_point(self):
+        """stress and strain at the end of the stress strain curve"""
+        return self.stress[-2], self.strain[-2]
+    
+    @_memoized
+    def ultimate_point(self):
+        """maximum stress and its strain"""
+        i = np.argmax(self.stress)
+        return self.stress[i], self.strain[i]
+    
+    @property
+    def density(self):
+        return self.mass/self.volume
+    
+    @property
+    def yield_strength(self):
+        return self.yield_point[0]
+    
+    @property
+    def yield_strain(self):
+        return self.yield_point[1]
+    
+    @property
+    def specific_stiffness(self):
+        return self.E*1000/self.density #E back in MPa
+    
+    @property
+    def breaking_strength(self):
+        return self.breaking_point[0]
+    
+    @property
+    def breaking_strain(self):
+        return self.breaking_point[1]
+    
+    @property
+    def specific_strength(self):
+        return self.breaking_strength/self.density
+    
+    @property
+    def ultimate_strength(self):
+        return self.ultimate_point[0]
+    
+    @property
+    def ultimate_strain(self):
+        return self.ultimate_point[1]
+    
+    @property
+    def _stress_series(self):
+        return None if self.stress is None else pd.Series(self.stress, name = "stress", copy = False)
+    
+    @property
+    def _strain_series(self):
+        return None if self.strain is None else pd.Series(self.strain, name = "strain", copy = False)
+    
+    def _names(self):
+        return self._legacy_MC if self.MC_sim else self._legacy
+    
+    def __len__(self):
+        return len(self._names())
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(getattr(self, name) for name in self._names()[index])
+        return getattr(self, self._names()[index])
+    
+    def __iter__(self):
+        return (getattr(self, name) for name in self._names())
+    
+    def __repr__(self):
+        if self.stress is None:
+            return "StressStrainResult(streamed)"
+        return f"StressStrainResult({len(self.stress)} points)"
+
+
+def _estimateRows(filename, sample = 2**16):
+    
+    """
+    Number of rows of a csv estimated from its size and the length of its first lines, without reading it.
+    """
+    
+    with open(filename, "rb") as f:
+        head = f.read(sample)
+    lines = head.count(b"\n")
+    if lines == 0 or len(head) < sample: #short file, the head is all of it
+        return max(lines, 1)
+    
+    return int(os.path.getsize(filename)/(len(head)/lines))
+
+
+def getStressStrain(filename, area, mass = 1, volume = 1, MC_sim = False, chunksize = None, elastic_region = "fixed", dtype = None,
+                    need_curve = True):
+    
+    """
+    Takes data from a UTM and generates stress, strain, and various material properties.
+    
+    Parameters: 
+        filename: str, csv file. 
+        area: float
+            cross sectional area of testing specimen
+        mass: float
+            used to calculate any specific properties
+        volume: float
+            used to calculate various material properties
+        MC_sim: bool, optional
+            If the user wants uncertainty in the modulus of elasticty, making this true will make it a returned value.
+        chunksize: int, optional
+            streams the file this many rows at a time with bounded memory, for very long UTM logs. The stress and strain
+            columns are not kept, so None is returned in their place. Cannot be used with MC_sim.
+        elastic_region: str, optional
+            "fixed" takes the elastic region as strains up to .2% and yield as its last point. "auto" finds the linear region
+            with findElasticRegion and yield with the .2% offset method. Cannot be used with chunksize.
+        dtype: numpy dtype, optional
+            np.float32 halves the memory of the curve. By default it is float64, unless the curve would not fit in
+            CURVE_MEMORY_BUDGET bytes: then float32 is used. If even that does not fit, a MemoryError is raised, or with
+            need_curve = False the file is streamed as with chunksize (unless MC_sim or elastic_region = "auto" need the curve).
+        need_curve: bool, optional
+            False when only the properties are used, so a file over CURVE_MEMORY_BUDGET can be streamed without keeping
+            stress and strain.
+    Returns:
+      a StressStrainResult. Its properties (E, E_uncertainty, yield_strength, yield_strain, specific_stiffness, breaking_strength,
+      breaking_strain, specific_strength, ultimate_strength, ultimate_strain) are only computed when accessed. It can still be indexed
+      like the old tuple: a dataframe column of stress values, a dataframe column of strain values, modulus of elasticity, uncertainty
+      if MC_sim = True, yield strength, yield strain, specific modulus, breaking strength, breaking strain, specific strength,
+      ultimate strength, ultimate strain
+    """
+    
+    if chunksize is not None:
+        if MC_sim:
+            raise ValueError("Cannot use MC_sim and chunksize simultaneously.")
+        if elastic_region != "fixed":
+            raise ValueError('chunksize only supports elastic_region = "fixed".')
+        return _streamStressStrain(filename, area, mass, volume, chunksize)
+    
+    if dtype is None and CURVE_MEMORY_BUDGET is not None:
+        rows = _estimateRows(filename)
+        dtype = np.float64
+        if 3*8*rows > CURVE_MEMORY_BUDGET: #strain, load and stress
+            dtype = np.float32
+            if 3*4*rows > CURVE_MEMORY_BUDGET:
+                if need_curve or MC_sim or elastic_region != "fixed":
+                    raise MemoryError(f"The curve of {filename} ({rows} rows) does not fit in CURVE_MEMORY_BUDGET even as float32, "
+                                      "use chunksize or need_curve = False to stream its properties.")
+                return _streamStressStrain(filename, area, mass, volume, max(10**4, CURVE_MEMORY_BUDGET//64))
+    
+    with Profiler.span("load UTM"):
+        strain, load = _loadUTM(filename, dtype or np.float64) #parsed once per file, repeat calls skip reading the csv
+    
+    return StressStrainResult(load/area, strain, mass, volume, MC_sim, elastic_region = elastic_region)
+    
+_batch_properties = ("E", "yield_strength", "yield_strain", "specific_stiffness", "ultimate_strength", "ultimate_strain",
+                     "breaking_strength", "breaking_strain", "specific_strength")
+
+
+def _analyzeSpecimen(filename, area, mass, volume, MC_sim):
+    
+    """
+    Runs getStressStrain on one file for batchStressStrain. Errors are returned instead of raised so one bad file does not stop
+    the batch.
+    """
+    
+    row = {"file": filename}
+    try:
+        result = getStressStrain(filename, area, mass, volume, need_curve = MC_sim) #E_uncertainty needs the curve
+        for name in _batch_properties:
+            row[name] = float(getattr(result, name))
+        if MC_sim:
+            row["E_uncertainty"] = float(result.E_uncertainty)
+        row["error"] = None
+    except Exception as error:
+        row["error"] = f"{type(error).__name__}: {error}"
+        
+    return row
+
+
+@Profiler.profiled("batchStressStrain")
+def batchStressStrain(files, dimensions, workers = None, MC_sim = False):
+    
+    """
+    Analyzes many UTM files at once, spread across a pool of processes.
+    
+    Parameters:
+        files: str or list
+            a directory (every .csv in it), a glob pattern like "tests/*.csv", or a list of file names.
+        dimensions: pandas DataFrame, dict or str
+            specimen dimensions, a table (or csv file) with a "file" column matching the file names (with or without the
+            folder and .csv), an "area" column, and optionally "mass", "volume" and a "material" column to group by.
+        workers: int, optional
+            number of processes, defaults to the number of cores. 1 runs everything in this process.
+        MC_sim: bool, optional
+            also calculates the Monte Carlo uncertainty of the modulus of elasticity.
+            
+    Returns:
+        a DataFrame with one row per file of the material properties and an "error" column that holds the error message for
+        any file that could not be analyzed.
+    """
+    
+    if isinstance(files, str):
+        pattern = os.path.join(files, "*.csv") if os.path.isdir(files) else files
+        files = sorted(glob.glob(pattern))
+        
+    if isinstance(dimensions, str):
+        dimensions = pd.read_csv(dimensions)
+    dimensions = pd.DataFrame(dimensions)
+    if "file" not in dimensions:
+        raise ValueError("dimensions must have a file column.")
+    if "area" not in dimensions:
+        raise ValueError("dimensions must have an area column.")
+    
+    lookup = {} #every way a file may be written in the table points to its row of dimensions
+    for _, row in dimensions.iterrows():
+        name = str(row["file"])
+        lookup[name] = lookup[os.path.basename(name)] = lookup[os.path.splitext(os.path.basename(name))[0]] = row
+    
+    def find(filename): #dimensions of a file, or None
+        base = os.path.basename(filename)
+        for name in (filename, base, os.path.splitext(base)[0]):
+            if name in lookup:
+                return lookup[name]
+        return None
+    
+    jobs = []
+    rows = []
+    for filename in files:
+        row = find(filename)
+        if row is None:
+            rows += [{"file": filename, "error": "ValueError: no dimensions given for this file"}]
+        else:
+            jobs += [(filename, float(row["area"]), float(row.get("mass", 1)), float(row.get("volume", 1)), MC_sim)]
+    
+    if workers == 1 or len(jobs) <= 1:
+        rows += [_analyzeSpecimen(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            rows += list(pool.map(_analyzeSpecimen, *zip(*jobs)))
+    
+    results = pd.DataFrame(rows, columns = ["file", *_batch_properties, *(["E_uncertainty"] if MC_sim else []), "error"])
+    results = results.set_index("file").reindex(files).reset_index() #same order as the files
+    
+    if "material" in dimensions:
+        results.insert(1, "material", [None if find(name) is None else find(name)["material"] for name in results["file"]])
+    
+    return results
+
+
+def summarizeBatch(results, by = "material"):
+    
+    """
+    Mean and scatter of every material property in the output of batchStressStrain, per group.
+    
+    Parameters:
+        results: pandas DataFrame
+            output of batchStressStrain, files that errored are left out.
+        by: str, optional
+            column to group by.
+            
+    Returns:
+        a DataFrame with one row per group and the mean, standard deviation, coefficient of variation and number of specimens
+        of each property.
+    """
+    
+    ok = results[results["error"].isna()]
+    columns = [name for name in ok.columns if name in _batch_properties or name == "E_uncertainty"]
+    
+    summary = ok.groupby(by)[columns].agg(["mean", "std", "count"])
+    for name in columns:
+        summary[(name, "cv")] = summary[(name, "std")]/summary[(name, "mean")].abs() #scatter relative to the mean
+        
+    return summary.sort_index(axis = 1, level = 0, sort_remaining = False)
+
+
+class MonteCarloResult(namedtuple("MonteCarloResult", ["value", "uncertainty", "samples", "N"])):
+    
+    """
+    Result of MonteCarlo. Unpacks like a tuple (value, uncertainty, samples, N) and prints as "value +/- uncertainty".
+    samples is None unless the raw simulated evaluations were requested, N is the number of simulations that were run.
+    """
+    
+    __slots__ = ()
+    
+    def __str__(self):
+        return f"{self.value:.5f} +/- {self.uncertainty}"
+
+
+def _expr_draw(MC_evaluated, symbol_sub, U_sub, n, rng, sampler = None):
+    
+    """
+    Simulates n evaluations of a lambdified expression. sampler is from _make_sampler.
+    """
+    
+    #every variable is simulated in one draw where the values are means and the uncertainties are two STDEVs
+    if sampler is None:
+        MC = rng.normal(symbol_sub[:,None], U_sub[:,None]/2, size = (len(symbol_sub), n))
+    else:
+        MC = symbol_sub[:,None] + U_sub[:,None]/2*sampler(n).T
+    
+    #the simulations are then substituted back into the lambdify function
+    return np.array(np.broadcast_to(MC_evaluated(*MC), (n,)), dtype = float) #constant expressions give back a scalar
+
+
+def _expr_block(seed, n, expr, symbols, symbol_sub, U_sub, keep, sampler = "random"):
+    
+    """
+    One block of MonteCarlo simulations with its own random stream, runs in a worker process (which compiles the expression once).
+    """
+    
+    rng = np.random.default_rng(seed)
+    draws = _make_sampler(sampler, len(symbols), rng)
+    
+    return _summarize_block(_expr_draw(_lambdified(expr, symbols), symbol_sub, U_sub, n, rng, draws), keep)
+
+
+@Profiler.profiled("MonteCarlo", count = "N")
+def MonteCarlo(expr, N = 10000, samples = False, seed = None, tol = None, max_sims = 10**7, workers = None, sampler = "random",
+               **kwargs):
+    
+    """
+    Calculates propagated error using the Monte Carlo method, does not work for large uncertainties.
+    
+    Parameters:
+        expr: sympy_object, string
             a syntactically correct algebraic expression
         N: int, optional
             number of Monte Carlo simulations
+        samples: bool, optional
+            if True the simulated evaluations of the expression are kept in the result.
+        seed: int or numpy.random.Generator, optional
+            seeds the random draws so results can be reproduced.
+        tol: float, optional
+            adaptive mode. Simulations are run N at a time, keeping only a running mean and variance, until the 95%
+            confidence half width of the uncertainty is at most tol (same units as the expression).
+        max_sims: int, optional
+            most simulations the adaptive mode may run.
+        workers: int, optional
+            parallel mode. The simulations are split into blocks of MC_BLOCK (N in adaptive mode) that run across this many
+            processes, each block with its own random stream spawned from seed. For a given seed the result is the same for any
+            number of workers, and without workers too (a seeded run always uses the blocks). On Windows, call it from under
+            if __name__ == "__main__".
+        sampler: str, optional
+            "random" (pseudo-random), or the low discrepancy "sobol", "halton" or "lhs" (Latin hypercube) that usually reach
+            the same precision with far fewer simulations. See compareSamplers. Sobol points are only balanced in powers of two,
+            so "sobol" rounds the number of simulations up to one.
         kwargs: dict, optional
             user must give the symbols and corresponding values, as well as the uncertainties by giving U_ followed by the var symbol.
             
     Returns:
-        the result of the expression and the corresponding uncertainty.
+        a MonteCarloResult with the result of the expression, the corresponding uncertainty and optionally the samples.
     """
     
-    if isinstance(expr,str): #if input is a string, it turns it into a sympy expression
-        expr = sym.sympify(expr)
+    expr, symbols = _parse_expr(expr)
+    names = [str(symbol) for symbol in symbols]
+    
+    for name in names:
+        if name not in kwargs:  #checks if there is any missing value provided in kwargs
+            raise ValueError(f"Symbol {name} value MUST be provided")
+        elif "U_" + name not in kwargs:
+            raise ValueError(f"Uncertainty U_{name} value MUST be provided.")
+    
+    symbol_sub = np.array([kwargs[name] for name in names], dtype = float) #symbol substitution values
+    U_sub = np.array([kwargs["U_" + name] for name in names], dtype = float) #uncertainty symbol substitution values
 
-    MC = [] #a list of different rand_data lists
-    rand_data = [] # a list that will simulate new expression evaluations using the inverse cdf function where the values
-                   # are means, the uncertainties are two STDEVs, and the probability is random
-    symbols = expr.free_symbols #creates a list of symbols in a sympy expression
-    U_symbol = [] #uncertainty symbols
-    U_sub = [] #uncertainty symbol substitution values
-    symbol_sub = [] #symbol substitution values
+    MC_evaluated = _lambdified(expr, symbols) #evaluates the expression and can take np array inputs
+    
+    value = float(MC_evaluated(*symbol_sub))
+    
+    N, max_sims, block = _sobol_sizes(sampler, N, max_sims)
+    
+    if workers is not None or seed is not None: #seeded runs always use the blocks, so workers does not change the result
+        block_size, total = (N, max_sims) if tol is not None else (block, N)
+        stats, chunks = _parallel_mc(_expr_block, (expr, symbols, symbol_sub, U_sub, samples, sampler), block_size, total, seed,
+                                     workers or 1, tol, keep = samples)
+        return MonteCarloResult(value, 1.95*float(stats.std), np.concatenate(chunks) if samples else None, stats.n)
+    
+    rng = np.random.default_rng(seed)
+    draws = _make_sampler(sampler, len(symbols), rng)
+    draw = lambda n: _expr_draw(MC_evaluated, symbol_sub, U_sub, n, rng, draws)
+    
+    if tol is not None:
+        stats, chunks = _adaptive_mc(draw, N, tol, max_sims, keep = samples)
+        return MonteCarloResult(value, 1.95*float(stats.std), np.concatenate(chunks) if samples else None, stats.n)
+    
+    sims = draw(N) #its standard deviation is used to get uncertainty
+    
+    return MonteCarloResult(value, 1.95*float(sims.std()), sims if samples else None, N)
 
-    for i, symbol in enumerate(symbols):
-        U_symbol += ["U_"+str(symbol)] #creates a list of uncertainty symbols
-        U_symbol[i] = sym.symbols(U_symbol[i])
+@Profiler.profiled("MonteCarloCov", count = "N")
+def MonteCarloCov(expr, cov = None, correlation = None, N = 10000, samples = False, seed = None, **kwargs):
+    
+    """
+    Monte Carlo propagation of correlated uncertainties, the check on get_RSS_cov. The variables are drawn together from a
+    multivariate normal distribution through the Cholesky factor of their covariance. Like MonteCarlo the uncertainties (and Σ)
+    are two STDEVs, so Σ/4 is the covariance that is drawn from and 1.95 STDEVs of the results is returned.
+    
+    Parameters:
+        expr: sympy_object, string
+            a syntactically correct algebraic expression
+        cov, correlation: optional
+            covariance matrix of the variables, or correlation coefficients used with the U_ kwargs, see get_RSS_cov.
+        N: int, optional
+            number of Monte Carlo simulations
+        samples: bool, optional
+            if True the simulated evaluations of the expression are kept in the result.
+        seed: int or numpy.random.Generator, optional
+            seeds the random draws so results can be reproduced.
+        kwargs: dict, optional
+            the value of every symbol, and its U_ uncertainty when cov is not given.
+            
+    Returns:
+        a MonteCarloResult with the result of the expression, the corresponding uncertainty and optionally the samples.
+    """
+    
+    expr, symbols = _parse_expr(expr)
+    names = [str(symbol) for symbol in symbols]
+    
+    for name in names:
+        if name not in kwargs:  #checks if there is any missing value provided in kwargs
+            raise ValueError(f"Symbol {name} value MUST be provided")
+    
+    symbol_sub = np.array([kwargs[name] for name in names], dtype = float)
+    Sigma = _covariance(names, kwargs, cov, correlation, ())/4 #two STDEVs squared
+    try:
+        L = np.linalg.cholesky(Sigma)
+    except np.linalg.LinAlgError: #perfectly correlated or zero uncertainties, factor the positive semidefinite matrix instead
+        w, V = np.linalg.eigh(Sigma)
+        L = V*np.sqrt(np.clip(w, 0, None))
         
-        if str(symbol) not in kwargs:  #checks if there is any missing value provided in kwargs
-            raise ValueError(f"Symbol {symbol} value MUST be provided")
-        elif str(U_symbol[i]) not in kwargs:
-            raise ValueError(f"Uncertainty {U_symbol[i]} value MUST be provided.")
-
-        for j in kwargs:
-            if str(symbol) == j:
-                symbol_sub += [kwargs[j]]
-            elif str(U_symbol[i]) == j:
-                U_sub += [kwargs[j]]
+    rng = np.random.default_rng(seed)
+    MC = symbol_sub[:,None] + L @ rng.standard_normal((len(names), N))
+    
+    MC_evaluated = _lambdified(expr, symbols)
+    value = float(MC_evaluated(*symbol_sub))
+    sims = np.array(np.broadcast_to(MC_evaluated(*MC), (N,)), dtype = float)
+    
+    return MonteCarloResult(value, 1.95*float(sims.std()), sims if samples else None, N)
 
-    MC_evaluated = sym.lambdify(tuple(symbols), expr, "numpy") #creates a function that evaluates an expression and can take np array inputs
 
-    for i,symbol in enumerate(symbols):
-        for j in range(N):
-            rand_data += [norm.ppf(random.uniform(0,1), loc = symbol_sub[i], scale = U_sub[i]/2)]
-        MC.insert(i, np.array(rand_data)) #creates a list of multiple monte carlo simulations
-        rand_data = [] #initializizng to null list again
+def compareSamplers(expr = None, sizes = (2**8, 2**10, 2**12, 2**14), repeats = 20, samplers = SAMPLERS, **kwargs):
     
-    #the list of simulations are then substituted back into the lambdify function and its standard deviation is used to get uncertainty
-    return print(f"{MC_evaluated(*symbol_sub):.5f} +/- {1.95*MC_evaluated(*MC).std()}")
+    """
+    Convergence report of the Monte Carlo samplers. Every sampler is run repeats times (seeds 0, 1, ...) at every number of
+    simulations and the scatter of the results between the repeats shows how precise each sampler is for that many simulations.
+    
+    Parameters:
+        expr: sympy_object, string, optional
+            compares MonteCarlo on this expression, kwargs are its values and U_ uncertainties.
+            If not given getMonteCarlo is compared, and kwargs are its x, y, U_x, U_y and slope or integral.
+        sizes: list, optional
+            numbers of simulations.
+        repeats: int, optional
+            runs of each sampler at each size.
+        samplers: list, optional
+            samplers to compare.
+            
+    Returns:
+        a DataFrame with one row per sampler and size: the mean over the repeats of the average (getMonteCarlo only) and of the
+        uncertainty, and their standard deviations between repeats (smaller is more precise).
+    """
+    
+    rows = []
+    for sampler in samplers:
+        for N in sizes:
+            averages = []
+            uncertainties = []
+            for seed in range(repeats):
+                if expr is not None:
+                    result = MonteCarlo(expr, N = N, seed = seed, sampler = sampler, **kwargs)
+                    averages += [np.nan]
+                    uncertainties += [result.uncertainty]
+                else:
+                    avg, CI = getMonteCarlo(num_sims = N, seed = seed, sampler = sampler, **kwargs)
+                    averages += [avg]
+                    uncertainties += [CI]
+            rows += [{"sampler": sampler, "N": N, 
+                      "average": np.mean(averages), "average_scatter": np.std(averages), 
+                      "uncertainty": np.mean(uncertainties), "uncertainty_scatter": np.std(uncertainties)}]
+    
+    report = pd.DataFrame(rows)
+    if expr is not None:
+        report = report.drop(columns = ["average", "average_scatter"])
+        
+    return report
+
 
 def main():
     
@@ -5,97 +5,436 @@ Created on Mon Dec  5 10:50:30 2022
 @author: jkhou
 """
 
-from bs4 import BeautifulSoup
-import requests
+import os
+import time
+import json
+import hashlib
+import threading
+import re
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-from IPython.display import display
-import math
 
-url = requests.get("https://www.engineeringtoolbox.com/young-modulus-d_417.html")
-soup = BeautifulSoup(url.text, "html.parser")
+try:
+    from MoMpy import Profiler
+except ImportError: #imported from inside the MoMpy folder, like "from Uncertainty import *"
+    import Profiler
 
-table1 = soup.find('table', id = 'tablesorter')
+#the table is no longer scraped on import. It is loaded the first time it is needed from a local copy of the page or the cached
+#download (CACHE_FILE), and only downloaded when neither exists.
+URL = "https://www.engineeringtoolbox.com/young-modulus-d_417.html"
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "MoMpy", "young-modulus.html")
+TTL = 7*24*60*60 #seconds before the cached page is refreshed in the background, None never refreshes
+SOURCES = [URL] #pages Fetch_Tables combines by default, any page with the same kind of table can be added
+SOURCES_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "MoMpy", "sources") #last copy of every source and its validators
 
-headers = []
-for i in table1.find_all('th'):
- title = i.text
- headers.append(title)
+_mydata = None
+_lock = threading.Lock()
+_refreshing = None #background refresh thread
+_session = None #shared requests session, its connections are reused across requests and threads
+_session_lock = threading.Lock() #not _lock, which Load_Table holds while it downloads
+
+_properties = ["Youngs Modulus (GPa)", "Ultimate Tensile Strength (MPa)", "Yield Strength (MPa)"]
+_index = (None, {}) #(table, {property: (sorted mins, maxs in the same order, row numbers)})
+
+_renames = {"Tensile Modulus(Young's Modulus, Modulus of Elasticity) - E -(GPa)": "Youngs Modulus (GPa)", 
+            "Ultimate Tensile Strength - σu - (MPa)": "Ultimate Tensile Strength (MPa)", 
+            "Yield Strength - σy - (MPa)":"Yield Strength (MPa)"}
+
+
+@Profiler.profiled("Parse_Table")
+def Parse_Table(html):
+    """ Parse the material table out of the engineeringtoolbox page
+    Args:
+        string: html of the page, downloaded or read from a saved file.
+        
+    Returns:
+        DataFrame of the materials and their properties as text like on the website, plus numeric "min" and "max" columns for each
+        property (a single value has min = max, a range like "69-79" has both ends).
+    """
+    from bs4 import BeautifulSoup
+    
+    with Profiler.span("BeautifulSoup", len(html)):
+        soup = BeautifulSoup(html, "html.parser")
+    table1 = soup.find('table', id = 'tablesorter')
+    if table1 is None:
+        raise ValueError("The page does not contain the material table")
+    
+    headers = [i.text for i in table1.find_all('th')]
+    rows = [[i.text for i in j.find_all('td')] for j in table1.find_all('tr')[1:]]
+    rows = [row for row in rows if len(row) == len(headers)] #skips any row that is not part of the table
+    
+    table = pd.DataFrame(rows, columns = headers).rename(columns = _renames) #built once instead of one row at a time
+    
+    for prop in _properties:
+        if prop in table:
+            bounds = np.array([_Parse_Range(text) for text in table[prop]]).reshape(-1, 2)
+            table[prop + " min"] = bounds[:, 0]
+            table[prop + " max"] = bounds[:, 1]
+    
+    return table
+
+
+def _Parse_Range(text):
+    """ Numeric (min, max) of a property as written on the website, "200", "2.7", "69-79" or "105 - 120". NaN if there is no number.
+    """
+    numbers = [float(x) for x in re.findall(r"\d+(?:\.\d+)?", text.replace(",", ""))]
+    if not numbers:
+        return np.nan, np.nan
+    return min(numbers), max(numbers)
+
+
+def _Range_Index(prop):
+    """ Sorted interval index of one property, built once per table
+    """
+    global _index
     
-mydata = pd.DataFrame(columns = headers)
+    mydata = Load_Table()
+    with _lock:
+        if _index[0] is not mydata:
+            _index = (mydata, {})
+        indexes = _index[1]
+        if prop not in indexes:
+            mins = mydata[prop + " min"].to_numpy()
+            maxs = mydata[prop + " max"].to_numpy()
+            order = np.argsort(mins, kind = "stable")
+            order = order[~np.isnan(mins[order])] #rows without a number can never match
+            indexes[prop] = (mins[order], maxs[order], order)
+        return mydata, indexes[prop]
 
-for j in table1.find_all('tr')[1:]:
- row_data = j.find_all('td')
- row = [i.text for i in row_data]
- length = len(mydata)
- mydata.loc[length] = row
 
+@Profiler.profiled("range lookup")
+def _Get_Range(prop, value, tolerance):
+    """ Rows whose property range overlaps value +/- tolerance (a fraction of value), in increasing order of the property
+    """
+    mydata, (mins, maxs, order) = _Range_Index(prop)
+    lower = value - abs(value)*tolerance
+    upper = value + abs(value)*tolerance
+    
+    k = np.searchsorted(mins, upper, side = "right") #only ranges starting below the upper bound can overlap
+    rows = order[:k][maxs[:k] >= lower]
     
-mydata = mydata.rename(columns={"Tensile Modulus(Young's Modulus, Modulus of Elasticity) - E -(GPa)": "Youngs Modulus (GPa)", 
-                       "Ultimate Tensile Strength - σu - (MPa)": "Ultimate Tensile Strength (MPa)", 
-                       "Yield Strength - σy - (MPa)":"Yield Strength (MPa)"})
+    return mydata.iloc[rows].reset_index(drop = True)
 
-def Get_MatE(value):
-    """ Obtain Material name from Youngs Modulus
+
+def Download_Table(url = URL, timeout = 10):
+    """ Download the page and save it to CACHE_FILE
     Args:
-        Integer value (in GPa).
+        url: string, optional.
+        timeout: seconds to wait for the website.
         
     Returns:
-        DataFrame of potential materials and other associated properties with that material.
+        DataFrame of the materials and their properties.
     """
+    with Profiler.span("download") as span:
+        page = Get_Session().get(url, timeout = timeout)
+        page.raise_for_status()
+        span.count = len(page.content)
+    table = Parse_Table(page.text) #only saved if it parses
     
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok = True)
+    tmp = CACHE_FILE + ".tmp"
+    with open(tmp, "w", encoding = "utf-8") as f:
+        f.write(page.text)
+    os.replace(tmp, CACHE_FILE)
     
-    lower = math.trunc(value - (value*.1))
-    upper = math.trunc(value + (value*.1))
-    i = np.arange(lower, upper, 1)
-    df=pd.DataFrame()
+    return table
+
+
+def Get_Session(retries = 3, connections = 10):
+    """ The requests session shared by every download, created on first use
+    Args:
+        retries: times a failed connection or a 429/5xx answer is retried, waiting longer each time.
+        connections: connections kept open per website, as many as there are threads downloading at once.
+        
+    Returns:
+        requests.Session
+    """
+    global _session
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total = retries, backoff_factor = .5, status_forcelist = (429, 500, 502, 503, 504), allowed_methods = ["GET"])
+            adapter = HTTPAdapter(pool_connections = connections, pool_maxsize = connections, max_retries = retry)
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def Fetch_Page(url, timeout = 10, cache_dir = None):
+    """ Download a page with a conditional request, so a page that has not changed is not downloaded again
+    Args:
+        url: string.
+        timeout: seconds to wait for the website.
+        cache_dir: folder for the saved copies and their ETag/Last-Modified, SOURCES_CACHE by default.
+        
+    Returns:
+        The html and how it was obtained: "downloaded", "not modified" (the saved copy is current) or "offline" (the website
+        could not be reached, the saved copy is used). Raises the error if there is no saved copy to fall back on.
+    """
+    cache_dir = cache_dir or SOURCES_CACHE
+    name = os.path.join(cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest())
+    saved = None
+    if os.path.exists(name + ".html") and os.path.exists(name + ".json"):
+        with open(name + ".json", encoding = "utf-8") as f:
+            saved = json.load(f)
+    
+    headers = {}
+    if saved is not None: #only send the validators when the copy they belong to is still there
+        if saved.get("etag"):
+            headers["If-None-Match"] = saved["etag"]
+        if saved.get("last_modified"):
+            headers["If-Modified-Since"] = saved["last_modified"]
+    
+    try:
+        with Profiler.span("download") as span:
+            page = Get_Session().get(url, headers = headers, timeout = timeout)
+            span.count = len(page.content)
+        if page.status_code == 304:
+            with open(name + ".html", encoding = "utf-8") as f:
+                return f.read(), "not modified"
+        page.raise_for_status()
+    except Exception:
+        if saved is None:
+            raise
+        with open(name + ".html", encoding = "utf-8") as f:
+            return f.read(), "offline"
+    
+    os.makedirs(cache_dir, exist_ok = True)
+    for ext, text in ((".html", page.text), 
+                      (".json", json.dumps({"url": url, "etag": page.headers.get("ETag"), "last_modified": page.headers.get("Last-Modified")}))):
+        tmp = name + ext + ".tmp"
+        with open(tmp, "w", encoding = "utf-8") as f:
+            f.write(text)
+        os.replace(tmp, name + ext) #never leaves a half written copy
+    
+    return page.text, "downloaded"
+
+
+def _Normalize_Name(name):
+    """ Material name as it is compared between sources, without case, extra spaces or punctuation differences
+    """
+    return re.sub(r"[\s,;]+", " ", str(name)).strip().casefold()
+
+
+def _Combine_Tables(tables):
+    """ One table of every material in tables (each with a Source column). A material in several tables gets one row: the
+    widest range of every property, the text of the first table that has it, and all its sources.
+    """
+    bounds = [prop + end for prop in _properties for end in (" min", " max")]
+    columns = ["Material", *_properties, *bounds, "Source"]
+    table = pd.concat([t.reindex(columns = columns) for t in tables], ignore_index = True)
+    if table.empty:
+        return table
+    
+    table["Material"] = table["Material"].astype(str).str.strip().str.replace(r"\s+", " ", regex = True)
+    key = table["Material"].map(_Normalize_Name)
+    aggregate = {"Material": "first", "Source": lambda sources: "; ".join(dict.fromkeys(sources.dropna()))}
+    aggregate.update({prop: "first" for prop in _properties}) #first non-missing text
+    aggregate.update({prop + " min": "min" for prop in _properties})
+    aggregate.update({prop + " max": "max" for prop in _properties})
+    
+    return table.groupby(key, sort = False).agg(aggregate).reset_index(drop = True)[columns]
+
+
+def Fetch_Tables(urls = None, workers = 8, timeout = 10, cache_dir = None):
+    """ Download several material pages at once and combine their tables
+    Args:
+        urls: list of pages with an engineeringtoolbox style material table, SOURCES by default.
+        workers: pages downloaded at the same time, they share the pooled connections of Get_Session.
+        timeout: seconds to wait for each website.
+        cache_dir: see Fetch_Page.
+        
+    Returns:
+        DataFrame like Parse_Table's with a Source column, one row per material (see _Combine_Tables). Pages that could not be
+        downloaded or parsed are left out and listed with their error in its attrs["errors"], and attrs["status"] tells how
+        every page was obtained.
+    """
+    urls = list(SOURCES if urls is None else urls)
+    
+    def fetch(url):
+        html, status = Fetch_Page(url, timeout, cache_dir)
+        table = Parse_Table(html)
+        table["Source"] = url
+        return table, status
+    
+    tables, status, errors = [], {}, {}
+    with ThreadPoolExecutor(max_workers = max(1, min(workers, len(urls)))) as pool:
+        futures = {url: pool.submit(fetch, url) for url in urls}
+        for url, future in futures.items(): #in the order of urls, so the first source wins ties
+            try:
+                table, status[url] = future.result()
+                tables += [table]
+            except Exception as error:
+                errors[url] = f"{type(error).__name__}: {error}"
+    
+    with Profiler.span("combine tables", sum(len(t) for t in tables)):
+        table = _Combine_Tables(tables)
+    table.attrs["errors"] = errors
+    table.attrs["status"] = status
+    return table
+
+
+def Load_Sources(urls = None, workers = 8, timeout = 10):
+    """ Use the combined table of several pages for the following lookups
+    Args:
+        see Fetch_Tables.
+        
+    Returns:
+        The combined DataFrame.
+    """
+    global _mydata
+    table = Fetch_Tables(urls, workers, timeout)
+    if table.empty:
+        raise ConnectionError(f"None of the material pages could be loaded: {table.attrs['errors']}")
+    with _lock:
+        _mydata = table
+    return table
+
+
+def Refresh_Table(background = True):
+    """ Download a fresh copy of the table and use it for the following lookups
+    Args:
+        background: bool, runs the download in a thread so nothing waits for the network.
+        
+    Returns:
+        The thread if background, otherwise the new DataFrame.
+    """
+    global _refreshing
+    
+    def refresh():
+        global _mydata
+        try:
+            table = Download_Table()
+        except Exception:
+            if not background:
+                raise
+            return None #offline, keep using the copy already loaded
+        with _lock:
+            _mydata = table
+        return table
+    
+    if not background:
+        return refresh()
+    
+    with _lock:
+        if _refreshing is None or not _refreshing.is_alive():
+            _refreshing = threading.Thread(target = refresh, daemon = True)
+            _refreshing.start()
+        return _refreshing
+
+
+def Load_Table(path = None):
+    """ Load the material table, this happens automatically on the first lookup
+    Args:
+        path: string, optional. A saved copy of the page to use instead.
+        
+    Returns:
+        DataFrame of the materials and their properties.
+    """
+    global _mydata
     
-    for x in i:
-        t = mydata.loc[mydata["Youngs Modulus (GPa)"]== str(x)]
-        if t.empty:
-            pass
+    if path is not None:
+        with open(path, encoding = "utf-8") as f:
+            table = Parse_Table(f.read())
+        with _lock:
+            _mydata = table
+        return table
+    
+    with _lock:
+        if _mydata is not None:
+            return _mydata
+        
+        if os.path.exists(CACHE_FILE):
+            with open(CACHE_FILE, encoding = "utf-8") as f:
+                _mydata = Parse_Table(f.read())
+            stale = TTL is not None and time.time() - os.path.getmtime(CACHE_FILE) > TTL
         else:
-            df = pd.concat([df, t], ignore_index = True)
-    return df   
+            try:
+                _mydata = Download_Table() #nothing saved yet, the first lookup has to wait for the website once
+            except Exception as error:
+                raise ConnectionError(f"The material table has not been saved yet and could not be downloaded: {error}")
+            stale = False
+    
+    if stale and TTL is not None:
+        Refresh_Table(background = True)
+        
+    return _mydata
+
+
+def __getattr__(name):
+    if name == "mydata": #old code reads the table directly
+        return Load_Table()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def Get_MatE(value, tolerance = .1):
+    """ Obtain Material name from Youngs Modulus
+    Args:
+        Number value (in GPa).
+        tolerance: fraction of value a material may be off by, 10% by default.
+        
+    Returns:
+        DataFrame of potential materials and other associated properties with that material.
+    """
+    return _Get_Range("Youngs Modulus (GPa)", value, tolerance)
 
-def Get_MatU(value):
+def Get_MatU(value, tolerance = .1):
     """ Obtain Material name from Ultimate Tensile Strength
     Args:
-        Integer value (in MPa).
+        Number value (in MPa).
+        tolerance: fraction of value a material may be off by, 10% by default.
         
     Returns:
         DataFrame of potential materials and other associated properties with that material.
-    """    
-    lower = math.trunc(value - (value*.1))
-    upper = math.trunc(value + (value*.1))
-    i = np.arange(lower, upper, 1)
-    df = pd.DataFrame()
-    for x in i:
-        t = mydata.loc[mydata["Ultimate Tensile Strength (MPa)"]== str(x)]
-        if t.empty:
-            pass
-        else:
-            df = pd.concat([df, t], ignore_index = True)
-    return df
-            
-def Get_MatY(value):
+    """
+    return _Get_Range("Ultimate Tensile Strength (MPa)", value, tolerance)
+
+def Get_MatY(value, tolerance = .1):
     """ Obtain Material name from Yield Strength
     Args:
-        Integer value (in MPa).
+        Number value (in MPa).
+        tolerance: fraction of value a material may be off by, 10% by default.
         
     Returns:
         DataFrame of potential materials and other associated properties with that material.
-    """ 
-    lower = math.trunc(value - (value*.1))
-    upper = math.trunc(value + (value*.1))
-    i = np.arange(lower, upper, 1)
-    df=pd.DataFrame()
-    for x in i:
-        t = mydata.loc[mydata["Yield Strength (MPa)"]== str(x)]
-        if t.empty:
-            pass
-        else:
-            df = pd.concat([df, t], ignore_index = True)
+    """
+    return _Get_Range("Yield Strength (MPa)", value, tolerance)
+
+@Profiler.profiled("Get_MatNearest")
+def Get_MatNearest(E = None, U = None, Y = None, n = 5):
+    """ Rank materials by how close they are to several properties at once
+    Args:
+        E: Youngs Modulus (in GPa), optional.
+        U: Ultimate Tensile Strength (in MPa), optional.
+        Y: Yield Strength (in MPa), optional.
+        n: number of materials to return.
+        
+    Returns:
+        DataFrame of the n closest materials and their properties, with a "Distance" column. The distance is the combined (root sum
+        square) relative distance from each given value to the material's range, 0 when every value is inside its range.
+    """
+    mydata = Load_Table()
+    given = [(prop, value) for prop, value in zip(_properties, (E, U, Y)) if value is not None]
+    if not given:
+        raise ValueError("Please give at least one property")
+    
+    distance = np.zeros(len(mydata))
+    for prop, value in given:
+        mins = mydata[prop + " min"].to_numpy()
+        maxs = mydata[prop + " max"].to_numpy()
+        outside = np.maximum(mins - value, 0) + np.maximum(value - maxs, 0) #0 inside the range
+        distance += (outside/abs(value))**2
+    distance = np.sqrt(distance) #materials missing one of the properties stay NaN and are left out
+    
+    order = np.argsort(distance, kind = "stable")
+    order = order[~np.isnan(distance[order])][:n]
+    df = mydata.iloc[order].reset_index(drop = True)
+    df["Distance"] = distance[order]
     return df
             
 def Get_Prop(mat):
@@ -106,6 +445,7 @@ def Get_Prop(mat):
     Returns:
         DataFrame of that material's properties.
     """ 
+    mydata = Load_Table()
     k = mydata.loc[mydata['Material']== mat]
     df=pd.DataFrame()
     if k.empty:
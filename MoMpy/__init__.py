@@ -1 +1,18 @@
+"""
+MoMpy: Mechanics of Materials lab tools. The modules are only imported when they are first used, so "import MoMpy" is instant
+and "MoMpy.Uncertainty" or "MoMpy.Webscraper" loads the one that is needed.
+"""
 
+import importlib
+
+__all__ = ["Uncertainty", "Webscraper", "Profiler", "Server"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Measures how long MoMpy and the GUI take to import, so slow startups get caught. Every target is imported in a fresh
+interpreter with "python -X importtime", which reports the cost of every module it loads. The cold start of the GUI is measured
+by running only the import statements at the top of run_GUI.py (the window itself is not opened).
+
+Usage, from the repository folder:
+
+    python benchmarks/import_time.py                          prints the cost of each target and its slowest modules
+    python benchmarks/import_time.py --save results.json      also saves the results
+    python benchmarks/import_time.py --check results.json     fails if a target got more than 50% slower than the saved results
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {"MoMpy": "import MoMpy",
+           "MoMpy.Uncertainty": "import MoMpy.Uncertainty",
+           "MoMpy.Webscraper": "import MoMpy.Webscraper"}
+
+
+def gui_imports():
+
+    """
+    The import statements at the top level of run_GUI.py, which is what the GUI pays before its window appears.
+    """
+
+    with open(os.path.join(ROOT, "run_GUI.py"), encoding = "utf-8") as f:
+        tree = ast.parse(f.read())
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+    return "\n".join(ast.unparse(node) for node in imports)
+
+
+def import_time(code):
+
+    """
+    Runs code in a new interpreter with -X importtime.
+
+    Returns:
+        the total time in seconds and a dictionary of the cumulative import time of every module in seconds.
+    """
+
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd = ROOT, capture_output = True, text = True)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    modules = {}
+    total = 0
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: #skips the header
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative_us)/1e6
+        if not name.startswith("  "): #nested imports are indented, their time is already in the cumulative time above them
+            total += int(cumulative_us)/1e6
+
+    return total, modules
+
+
+def run(repeat = 3):
+
+    """
+    Measures every target repeat times and keeps the fastest run (the least disturbed by other programs).
+
+    Returns:
+        a dictionary of target name to its total time and its module times.
+    """
+
+    targets = dict(TARGETS, gui = gui_imports())
+    results = {}
+    for name, code in targets.items():
+        runs = [import_time(code) for i in range(repeat)]
+        total, modules = min(runs, key = lambda run: run[0])
+        results[name] = {"total": total, "modules": modules}
+
+    return results
+
+
+def check(results, baseline, tolerance = 1.5):
+
+    """
+    Compares results with a saved baseline.
+
+    Returns:
+        a list of messages for the targets that are more than tolerance times slower.
+    """
+
+    slower = []
+    for name, result in results.items():
+        if name in baseline and result["total"] > tolerance*baseline[name]["total"]:
+            slower += [f"{name}: {result['total']:.3f} s, was {baseline[name]['total']:.3f} s"]
+
+    return slower
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Import time benchmark of MoMpy and its GUI.")
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs per target, the fastest is kept")
+    parser.add_argument("--top", type = int, default = 8, help = "number of slowest modules to show per target")
+    parser.add_argument("--save", help = "json file to save the results to")
+    parser.add_argument("--check", help = "json file of earlier results to compare to")
+    parser.add_argument("--tolerance", type = float, default = 1.5, help = "allowed slowdown factor for --check")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+
+    for name, result in results.items():
+        print(f"{name}: {result['total']:.3f} s")
+        slowest = sorted(result["modules"].items(), key = lambda item: -item[1])[:args.top]
+        for module, seconds in slowest:
+            print(f"    {seconds:8.3f} s  {module}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent = 1)
+
+    if args.check:
+        with open(args.check) as f:
+            slower = check(results, json.load(f), args.tolerance)
+        for message in slower:
+            print("SLOWER", message)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
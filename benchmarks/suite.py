@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Times the main MoMpy functions on synthetic data of growing size and records how their time and peak memory scale, so
+commits can be compared. Covers get_RSS (symbolic and evaluated), MonteCarlo, getMonteCarlo (slope and integral),
+getStressStrain and the Webscraper lookups. The data is generated, so nothing has to be downloaded: UTM csv files from 1e3 to
+1e7 rows, random expressions with more and more variables and material tables of growing length.
+
+Usage, from the repository folder:
+
+    python benchmarks/suite.py                               runs every benchmark up to 1e6 rows and prints the results
+    python benchmarks/suite.py --full                        also runs the 1e7 row UTM file (about 1 GB of disk)
+    python benchmarks/suite.py --only RSS,StressStrain       runs the benchmarks whose names contain one of these
+    python benchmarks/suite.py --save results.json           also saves the results
+    python benchmarks/suite.py --compare results.json        prints how much faster or slower each case is than saved results
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from MoMpy import Uncertainty, Webscraper
+
+
+def synthetic_utm(filename, rows, seed = 0):
+
+    """
+    Writes a UTM csv in the same layout as SampleUTMdata.csv (Time, Extension, Load, Strain 1 and a row of units) with a
+    steel-like curve: linear to yield, strain hardening to the ultimate strength, necking and a break. Noise is added to the load.
+    """
+
+    rng = np.random.default_rng(seed)
+    strain = np.linspace(0, .27, rows)
+    E, yield_strength, ultimate, ultimate_strain = 200e3, 360, 515, .15
+    e_y = yield_strength/E
+    stress = np.where(strain < e_y, E*strain,
+                      yield_strength + (ultimate - yield_strength)*np.sqrt(np.clip((strain - e_y)/(ultimate_strain - e_y), 0, 1)))
+    necking = strain > ultimate_strain
+    stress[necking] = ultimate - (ultimate - 300)*((strain[necking] - ultimate_strain)/(strain[-1] - ultimate_strain))**2
+    area = 41.93
+    load = stress*area + rng.normal(0, 5, rows)
+    time_s = np.arange(rows)*.1
+    extension = strain*50
+
+    with open(filename, "w") as f:
+        f.write("Time,Extension,Load,Strain 1\n(s),(mm),(N),(mm/mm)\n")
+        np.savetxt(f, np.column_stack([time_s, extension, load, strain]), fmt = "%.7f", delimiter = ",")
+
+    return filename
+
+
+def random_expression(n_vars, seed = 0):
+
+    """
+    A random algebraic expression of n_vars variables x0, x1, ... as a string, like "x0*x1/sqrt(x2) + x3**2". Every variable is
+    used once so get_RSS has n_vars partial derivatives to take.
+    """
+
+    rng = np.random.default_rng(seed)
+    functions = ["{}", "{}**2", "sqrt({})", "exp({})", "log({})", "sin({})"]
+    terms = [functions[rng.integers(len(functions))].format(f"x{i}") for i in range(n_vars)]
+    expr = terms[0]
+    for term in terms[1:]:
+        expr += rng.choice([" + ", " - ", "*", "/"]) + term
+
+    return expr
+
+
+def expression_values(n_vars):
+
+    """
+    Values and uncertainties (keyword arguments of get_RSS and MonteCarlo) for random_expression, all inside every function's domain.
+    """
+
+    values = {}
+    for i in range(n_vars):
+        values[f"x{i}"] = 1 + i/n_vars
+        values[f"U_x{i}"] = .01*values[f"x{i}"]
+
+    return values
+
+
+def synthetic_table(filename, rows, seed = 0):
+
+    """
+    Writes an html page with a material table like the engineeringtoolbox one, for Webscraper.Load_Table(path).
+    """
+
+    rng = np.random.default_rng(seed)
+    header = ["Material", *Webscraper._renames]
+
+    def cell(low, high): #a single value or a range, like the website
+        a = rng.uniform(low, high)
+        return f"{a:.0f}" if rng.random() < .5 else f"{a:.0f}-{a*rng.uniform(1, 1.3):.0f}"
+
+    lines = ['<html><body><table id="tablesorter">', "<tr>" + "".join(f"<th>{name}</th>" for name in header) + "</tr>"]
+    for i in range(rows):
+        cells = [f"Material {i}", cell(1, 400), cell(10, 2000), cell(5, 1500)]
+        lines += ["<tr>" + "".join(f"<td>{text}</td>" for text in cells) + "</tr>"]
+    lines += ["</table></body></html>"]
+
+    with open(filename, "w", encoding = "utf-8") as f:
+        f.write("\n".join(lines))
+
+    return filename
+
+
+def measure(function, repeat = 3, setup = None):
+
+    """
+    Runs function repeat times for the time (the fastest run is kept) and once more with tracemalloc for the peak memory, since
+    tracing slows it down. setup is called before every run, e.g. to clear caches.
+
+    Returns:
+        time in seconds and peak memory in bytes allocated by the function.
+    """
+
+    times = []
+    for i in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times += [time.perf_counter() - start]
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return min(times), peak
+
+
+def clear_expression_caches():
+    for cache in (Uncertainty._parse_expr, Uncertainty._lambdified, Uncertainty._rss_terms, Uncertainty._compile_rss):
+        cache.cache_clear()
+
+
+_tables = {} #file name -> table loaded from it
+
+
+def use_table(filename, rows):
+
+    """
+    Makes the synthetic table of rows materials the one the Webscraper lookups use, generating and parsing it only once.
+    """
+
+    if filename not in _tables:
+        synthetic_table(filename, rows)
+        _tables[filename] = Webscraper.Load_Table(filename)
+    Webscraper._mydata = _tables[filename]
+
+
+def cases(folder, full = False):
+
+    """
+    Every benchmark as (name, size, function, setup). Files are generated in folder as they are needed.
+    """
+
+    for n_vars in (2, 4, 8, 16):
+        expr = random_expression(n_vars)
+        values = expression_values(n_vars)
+        yield "get_RSS symbolic", n_vars, lambda expr = expr: Uncertainty.get_RSS(expr), clear_expression_caches
+        yield "get_RSS evaluate", n_vars, lambda expr = expr, values = values: Uncertainty.get_RSS(expr, evaluate = True, **values), None
+        yield "MonteCarlo", n_vars, lambda expr = expr, values = values: Uncertainty.MonteCarlo(expr, N = 10**5, seed = 0, **values), None
+
+    x = np.array([1., 2, 3, 4, 5])
+    y = 2*x + 1
+    for num_sims in (10**3, 10**4, 10**5, 10**6):
+        for kind in ("slope", "integral"):
+            yield (f"getMonteCarlo {kind}", num_sims,
+                   lambda n = num_sims, kind = kind: Uncertainty.getMonteCarlo(x, y, .01*x, .01*y, num_sims = n, seed = 0, **{kind: True}),
+                   None)
+
+    for rows in (10**3, 10**4, 10**5, 10**6) + ((10**7,) if full else ()):
+        filename = os.path.join(folder, f"utm_{rows}.csv")
+        yield ("getStressStrain", rows,
+               lambda filename = filename: [getattr(Uncertainty.getStressStrain(filename, 41.93, 67.01, 8.824), name)
+                                            for name in Uncertainty._batch_properties],
+               lambda filename = filename, rows = rows: (os.path.exists(filename) or synthetic_utm(filename, rows),
+                                                         Uncertainty.clearUTMCache()))
+
+    for rows in (10**2, 10**3, 10**4):
+        filename = os.path.join(folder, f"table_{rows}.html")
+        load = lambda filename = filename, rows = rows: use_table(filename, rows)
+        yield "Webscraper Load_Table", rows, lambda filename = filename: Webscraper.Load_Table(filename), load
+        yield "Webscraper Get_MatE", rows, lambda: [Webscraper.Get_MatE(value) for value in range(1, 400, 4)], load
+        yield "Webscraper Get_MatNearest", rows, lambda: [Webscraper.Get_MatNearest(E = value, U = 5*value) for value in range(1, 400, 4)], load
+
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd = ROOT, capture_output = True, text = True).stdout.strip()
+    except OSError:
+        return None
+
+
+def run(only = None, repeat = 3, full = False):
+
+    """
+    Runs the benchmarks whose names contain any of the strings in only (all of them by default).
+
+    Returns:
+        a dictionary of the environment and a list of results with the benchmark name, size, time (s) and peak memory (bytes).
+    """
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for name, size, function, setup in cases(folder, full):
+            if only and not any(part.lower() in name.lower() for part in only):
+                continue
+            seconds, peak = measure(function, repeat, setup)
+            results += [{"benchmark": name, "size": size, "time": seconds, "peak_memory": peak}]
+            print(f"{name:28s} {size:>10}  {seconds:10.4f} s  {peak/2**20:10.2f} MB", flush = True)
+
+    environment = {"commit": commit(), "date": datetime.datetime.now().isoformat(timespec = "seconds"),
+                   "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                   "processor": platform.processor(), "cpus": os.cpu_count()}
+
+    return {"environment": environment, "results": results}
+
+
+def compare(results, baseline):
+
+    """
+    Time ratios of results over a baseline for the cases in both.
+
+    Returns:
+        a list of (benchmark, size, ratio), a ratio above 1 is slower.
+    """
+
+    before = {(case["benchmark"], case["size"]): case["time"] for case in baseline["results"]}
+    return [(case["benchmark"], case["size"], case["time"]/before[case["benchmark"], case["size"]])
+            for case in results["results"] if (case["benchmark"], case["size"]) in before]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Benchmarks of MoMpy on synthetic data.")
+    parser.add_argument("--only", help = "comma separated parts of the names of the benchmarks to run")
+    parser.add_argument("--repeat", type = int, default = 3, help = "timed runs per case, the fastest is kept")
+    parser.add_argument("--full", action = "store_true", help = "include the 1e7 row UTM file")
+    parser.add_argument("--save", help = "json file to save the results to")
+    parser.add_argument("--compare", help = "json file of earlier results to compare to")
+    args = parser.parse_args()
+
+    results = run(args.only.split(",") if args.only else None, args.repeat, args.full)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent = 1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            ratios = compare(results, json.load(f))
+        for name, size, ratio in ratios:
+            print(f"{name:28s} {size:>10}  {ratio:6.2f}x {'slower' if ratio > 1 else 'faster'}")
+
+
+if __name__ == "__main__":
+    main()
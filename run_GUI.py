@@ -7,12 +7,143 @@ Created on Fri Dec  2 18:58:45 2022
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
-from MoMpy import Uncertainty as unc
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-from MoMpy import Webscraper as web
-import sympy as sym
+import importlib
+import threading
+
+#the MoMpy modules, sympy and matplotlib take seconds to import, so they are imported inside the functions that use them
+#and the window opens right away. Selecting a tab starts importing what that tab needs in the background.
+tab_modules = {0: ["MoMpy.Uncertainty", "matplotlib.backends.backend_tkagg"],
+               1: ["MoMpy.Uncertainty", "sympy"],
+               2: ["MoMpy.Uncertainty"],
+               3: ["MoMpy.Webscraper"]}
+
+def prefetch(event):
+    '''Imports the modules of the selected tab in a background thread
+    Args:
+        Tab changed event
+    Returns:
+        None
+    '''
+    names = tab_modules.get(notebook.index(notebook.select()), [])
+    threading.Thread(target = lambda: [importlib.import_module(name) for name in names], daemon = True).start()
+
+
 
+class Cancelled(Exception):
+    '''Raised inside a job when it was cancelled or replaced by a newer one'''
+
+
+class TaskRunner:
+    '''Runs the slow part of a button off the Tk main thread
+    Jobs run on a pool of worker threads. Their results are handed back to the main thread through a queue that is checked
+    with root.after, since tkinter widgets may only be touched from the main thread. Submitting a job with the same key as a
+    job that is still running replaces it, and the Cancel button stops the running jobs.
+    '''
+    
+    def __init__(self, root, progressbar, status, workers = 2, poll = 50, timings = None):
+        from concurrent.futures import ThreadPoolExecutor
+        import queue
+        self.root = root
+        self.progressbar = progressbar
+        self.status = status
+        self.timings = timings#when this tk variable is on, jobs are profiled and their slowest stages shown when they finish
+        self.profiles = {}#cancel event -> Profile of the job
+        self.pool = ThreadPoolExecutor(max_workers = workers)
+        self.results = queue.Queue()
+        self.running = {}#key -> cancel event of the newest job with that key
+        self.callbacks = {}#cancel event -> function to call with the result
+        self.poll = poll
+        self.root.after(self.poll, self.check)
+        
+    def submit(self, key, message, job, done):
+        '''Runs job in the background
+        Args:
+            key: jobs with the same key supersede each other
+            message: shown in the status bar while the job runs
+            job: function of a progress function, which it may call with the fraction done
+            done: called on the main thread with the result of job
+        Returns:
+            None
+        '''
+        if key in self.running:
+            self.running[key].set()#the older job is cancelled and its result thrown away
+        cancel = threading.Event()
+        self.running[key] = cancel
+        self.status.config(text = message)
+        self.progressbar.config(value = 0)
+        timed = self.timings is not None and self.timings.get()#tk variables may only be read on the main thread
+        
+        def progress(fraction):
+            if cancel.is_set():
+                raise Cancelled()
+            self.results.put((key, cancel, "progress", fraction))
+            
+        def work():
+            try:
+                if cancel.is_set():
+                    raise Cancelled()
+                if timed:
+                    from MoMpy import Profiler
+                    with Profiler.profile() as profile:
+                        result = job(progress)
+                    self.profiles[cancel] = profile
+                else:
+                    result = job(progress)
+                self.results.put((key, cancel, "done", result))
+            except Exception as error:
+                self.results.put((key, cancel, "error", error))
+                
+        self.callbacks[cancel] = done
+        self.pool.submit(work)
+        
+    def cancel(self):
+        '''Cancels every running job
+        '''
+        for event in self.running.values():
+            event.set()
+        self.running.clear()
+        self.status.config(text = "Cancelled")
+        self.progressbar.config(value = 0)
+        
+    def check(self):
+        '''Hands finished jobs back to the main thread, called every poll milliseconds
+        '''
+        import queue
+        try:
+            while True:
+                try:
+                    key, cancel, kind, value = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                if cancel.is_set() or self.running.get(key) is not cancel:#cancelled or superseded, ignore it
+                    if kind != "progress":
+                        self.callbacks.pop(cancel, None)
+                        self.profiles.pop(cancel, None)
+                    continue
+                if kind == "progress":
+                    self.progressbar.config(value = 100*value)
+                    continue
+                del self.running[key]
+                done = self.callbacks.pop(cancel)
+                if kind == "error":
+                    self.status.config(text = "Error: " + str(value))
+                else:
+                    self.status.config(text = "Done" + self.describe(self.profiles.pop(cancel, None)))
+                    self.progressbar.config(value = 100)
+                    try:
+                        done(value)
+                    except Exception as error:#e.g. writing into a window that was closed, the other jobs carry on
+                        self.status.config(text = "Error: " + str(error))
+        finally:
+            self.root.after(self.poll, self.check)#keeps polling even if something above failed
+        
+    def describe(self, profile, stages = 3):
+        '''The slowest stages of a profiled job for the status bar
+        '''
+        if profile is None or not profile.spans:
+            return ""
+        summary = profile.summary().head(stages)
+        return ": " + ", ".join("%s %.2f s" % (name, seconds) for name, seconds in summary["seconds"].items())
     
     
 def findvalue():
@@ -23,8 +154,10 @@ def findvalue():
         Values selected in listbox
     '''
     file = str(filedialog.askopenfilename())#select the name of the file that you want
+    selection = listbox.curselection()
+    specimen = float(area.get()), float(mass.get()), float(volume.get())
     labeler=[] 
-    x=0
+    
     def deletebutton():
         '''Deletes selected value
         Args: 
@@ -35,15 +168,22 @@ def findvalue():
         for i, label in list(enumerate(labeler)):
             label.destroy()#clears values from gui that were selected before
             delete.destroy()#clers the button that says delete
-        
-    for index in listbox.curselection():
-        labeler+=[tk.Label(tab1, text='The value of '+ properties[index] + ' is ' + 
-          str(unc.getStressStrain(file, float(area.get()), float(mass.get()),
-                                  float(volume.get()))[index]))]#creates a list of all the properties that were selected
-        labeler[x].pack()
-        x+=1
-    delete=tk.Button(tab1, text='delete', command=deletebutton)#adds delete button to gui
-    delete.pack(anchor=tk.S)
+            
+    def job(progress):
+        from MoMpy import Uncertainty as unc
+        results = unc.getStressStrain(file, *specimen, need_curve = False)#properties are only calculated when they are asked for
+        return [getattr(results, attributes[index]) for index in selection]
+    
+    def done(values):
+        nonlocal delete
+        for index, value in zip(selection, values):
+            labeler.append(tk.Label(tab1, text='The value of '+ properties[index] + ' is ' + str(value)))
+            labeler[-1].pack()#creates a list of all the properties that were selected
+        delete=tk.Button(tab1, text='delete', command=deletebutton)#adds delete button to gui
+        delete.pack(anchor=tk.S)
+    
+    delete = None
+    tasks.submit("findvalue", "Analyzing " + file, job, done)
     
         
 def graphtime():
@@ -54,30 +194,125 @@ def graphtime():
         Graph image in a new window
     
     '''
-    graphwindow = tk.Tk()#creates window
     file = str(filedialog.askopenfilename())#select the file to graph
-    values = unc.getStressStrain(file, float(area.get()))#creates a list of all the calyes returned my function
-
-    fig  =  Figure(figsize = (15,15), dpi = 100)#creates the figure
-    graphwindow.geometry('550x550')#creates the size of the window
-    graphwindow.title("Stress vs Strain")#creates the title of the window
-    graph = fig.add_subplot(111)#creates the graph
+    specimen_area = float(area.get())
     
-    graph.plot(values[6], values[5], 'm')#graphs the stress strain curve
-    graph.plot(values [7], values[1], 'rx', label = "Yield Strength %f MPa" % values[1])#plots the Yield strength
-    graph.plot(values[10], values[4], 'bo', label = "Ultimate Strength %f MPa" % values[4])#plots the ultimate strength
-    graph.plot(values[9], values[8], 'ko', label = "Breaking Strength %f MPa" % values[8])#plots the breaking strength
+    def job(progress):
+        from MoMpy import Uncertainty as unc
+        import matplotlib.backends.backend_tkagg#imported here so the main thread does not wait for it
+        values = unc.getStressStrain(file, specimen_area)#holds the curve, the properties are calculated as they are used
+        _ = values.yield_point, values.ultimate_point, values.breaking_point#calculated here instead of on the main thread
+        return values
     
-    graph.grid()
+    def done(values):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        from matplotlib.figure import Figure
+        from MoMpy import Uncertainty as unc
+        graphwindow = tk.Tk()#creates window
+        fig  =  Figure(figsize = (15,15), dpi = 100)#creates the figure
+        graphwindow.geometry('550x550')#creates the size of the window
+        graphwindow.title("Stress vs Strain")#creates the title of the window
+        graph = fig.add_subplot(111)#creates the graph
+        
+        peaks = [values.stress.argmax(), len(values.stress) - 2]#the ultimate and breaking points are always drawn exactly
+        def decimate(xlim = None):#only about 4 points per pixel of the window are drawn, so redrawing does not slow down with long tests
+            width = max(graphwindow.winfo_width(), 550)
+            return unc.decimateCurve(values.strain, values.stress, width, keep = peaks, xlim = xlim)
+        shown = decimate()
+        curve, = graph.plot(values.strain[shown], values.stress[shown], 'm')#graphs the stress strain curve
+        graph.plot(values.yield_strain, values.yield_strength, 'rx', label = "Yield Strength %f MPa" % values.yield_strength)#plots the Yield strength
+        graph.plot(values.ultimate_strain, values.ultimate_strength, 'bo', label = "Ultimate Strength %f MPa" % values.ultimate_strength)#plots the ultimate strength
+        graph.plot(values.breaking_strain, values.breaking_strength, 'ko', label = "Breaking Strength %f MPa" % values.breaking_strength)#plots the breaking strength
+        
+        graph.grid()
+        graph.set_xlabel("Strain")
+        graph.set_ylabel("Stress")
+        graph.legend();
+        
+        def zoomed(axes):#decimates again at the new zoom level so zooming in shows the detail
+            shown = decimate(axes.get_xlim())
+            curve.set_data(values.strain[shown], values.stress[shown])
+        graph.callbacks.connect('xlim_changed', zoomed)
+        
+        #draw the graph in the new window                                                                    
+        canvas = FigureCanvasTkAgg(fig, graphwindow)
+        NavigationToolbar2Tk(canvas, graphwindow)#zoom and pan
+        canvas.draw()
+        canvas.get_tk_widget().pack()
+    
+    tasks.submit("graphtime", "Graphing " + file, job, done)
+    
+    
+def livegraph(fps = 10):
+    '''Follows a UTM test while it runs
+    Args:
+        Area, mass, volume and the csv the machine is writing
+    Returns:
+        Window with the stress strain curve and the properties so far, updated fps times a second at most
+    '''
+    file = str(filedialog.askopenfilename())#select the file the machine is writing
+    from MoMpy import Uncertainty as unc
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+    import numpy as np
+    live = unc.LiveStressStrain(file, float(area.get()), float(mass.get()), float(volume.get()))
+    
+    livewindow = tk.Toplevel(root)#creates window
+    livewindow.title("Live: " + file)
+    fig = Figure(figsize = (6,5), dpi = 100)
+    graph = fig.add_subplot(111)
     graph.set_xlabel("Strain")
     graph.set_ylabel("Stress")
-    graph.legend();
-    
-    #draw the graph in the new window                                                                    
-    canvas = FigureCanvasTkAgg(fig, graphwindow)
-    canvas.draw()
+    graph.grid()
+    curve, = graph.plot([], [], 'm', animated = True)#drawn on its own with blitting
+    readout = tk.Label(livewindow, text = "Waiting for data", font = 10)
+    readout.pack(anchor = tk.W)
+    canvas = FigureCanvasTkAgg(fig, livewindow)
     canvas.get_tk_widget().pack()
     
+    strains, stresses = [], []#the curve so far
+    background = None
+    
+    def redraw_all(strain, stress):
+        graph.set_xlim(0, max(strain.max(), 1e-3)*1.5)#room to grow so the axes are not redrawn on every frame
+        graph.set_ylim(0, max(stress.max(), 1)*1.5)
+        canvas.draw()
+        
+    def drawn(event):#after any full redraw (new limits, resizing) the axes are saved to blit the curve onto
+        nonlocal background
+        background = canvas.copy_from_bbox(graph.bbox)
+        graph.draw_artist(curve)
+        
+    canvas.mpl_connect('draw_event', drawn)
+    
+    def update():
+        if not livewindow.winfo_exists():#window closed, stop following the file
+            return
+        try:
+            new_strain, new_stress = live.poll()#only the rows appended since the last frame are read
+            if len(new_strain):
+                strains.append(new_strain)
+                stresses.append(new_stress)
+                strain, stress = np.concatenate(strains), np.concatenate(stresses)
+                strains[:], stresses[:] = [strain], [stress]
+                if background is None or strain.max() > graph.get_xlim()[1] or stress.max() > graph.get_ylim()[1]:
+                    redraw_all(strain, stress)
+                shown = unc.decimateCurve(strain, stress, 600)
+                curve.set_data(strain[shown], stress[shown])
+                canvas.restore_region(background)
+                graph.draw_artist(curve)
+                canvas.blit(graph.bbox)
+                result = live.result()
+                readout.config(text = "%d points   E %.2f GPa   Yield %.2f MPa   UTS %.2f MPa" % 
+                               (live.rows, result.E, result.yield_strength, result.ultimate_strength))
+        except Exception as error:#one bad frame does not stop following the test
+            if livewindow.winfo_exists():
+                readout.config(text = "Could not read the file: " + str(error))
+        finally:
+            root.after(int(1000/fps), update)
+        
+    update()
+    
     
 def theRSS():
     '''Shows the Root Sum Squared expression and creates a window to enter RSS values
@@ -86,45 +321,56 @@ def theRSS():
     Returns:
         RSS
     '''
-    symbols  = list(sym.sympify(eq.get()).free_symbols)#creates a list of symbols
-    U_symbol = []#starts a list of Uncertainty symbols
+    expression = eq.get()
     
-    for i, symbol in enumerate(symbols):#for each symbol adds an uncertainty symbol  
-
-        U_symbol +=  ["U_"+str(symbol)]
-        
-        symbols[i] = str(symbol)
-        
-    rsslabel = tk.Label(tab2, text = unc.get_RSS(eq.get()))#creates space to enter expression
-    rsslabel.pack()
-    rsswindow  =  tk.Tk()
-    entry  =  []
-    newsymbols = symbols+U_symbol#creates a list of all the values required
-    def rssvalue():
-        '''
-        Args:
-            Values for prompted symbols
-        Returns:
-            Final value for the RSS
-        '''
-        entries = []#creates a list of entries
-        
+    def job(progress):
+        from MoMpy import Uncertainty as unc
+        import sympy as sym
+        symbols  = [str(symbol) for symbol in sym.sympify(expression).free_symbols]#creates a list of symbols
+        U_symbol = ["U_"+symbol for symbol in symbols]#for each symbol adds an uncertainty symbol
+        return symbols+U_symbol, unc.get_RSS(expression)
+    
+    def done(values):
+        newsymbols, rss = values#a list of all the values required and the RSS expression
+        rsslabel = tk.Label(tab2, text = rss)#creates space to enter expression
+        rsslabel.pack()
+        rsswindow  =  tk.Tk()
+        entry  =  []
         
-        for i in entry:
-            entries += [float(i.get())]#adds the values for the symbols inputted
+        def rssvalue():
+            '''
+            Args:
+                Values for prompted symbols
+            Returns:
+                Final value for the RSS
+            '''
+            entries = []#creates a list of entries
+            
+            for i in entry:
+                entries += [float(i.get())]#adds the values for the symbols inputted
+                
+            kwargs = dict(zip(newsymbols, entries))#creates a dictionary with the symbols and the values
+            
+            def evaluate(progress):
+                from MoMpy import Uncertainty as unc
+                return unc.get_RSS(expression, **kwargs, evaluate = True)
             
-        kwargs = dict(zip(newsymbols, entries))#creates a dictionary with the symbols and the values
-        label16 = tk.Label(rsswindow, text =  str(unc.get_RSS(eq.get(), **kwargs, evaluate = True)))#displays rss value
-        label16.pack()
+            def show(value):
+                label16 = tk.Label(rsswindow, text =  str(value))#displays rss value
+                label16.pack()
+                
+            tasks.submit("rssvalue", "Evaluating the RSS", evaluate, show)
+                
+        for i, symbol in enumerate(newsymbols):
+            label15 = tk.Label(rsswindow, text = "Enter value for " + str(symbol))#creates label indicating which values to input
+            label15.pack()
+            entry += [tk.Entry(rsswindow)]#adds spaces to enter the values
+            entry[i].pack()
             
-    for i, symbol in enumerate(newsymbols):
-        label15 = tk.Label(rsswindow, text = "Enter value for " + str(symbol))#creates label indicating which values to input
-        label15.pack()
-        entry += [tk.Entry(rsswindow)]#adds spaces to enter the values
-        entry[i].pack()
+        submit6 = tk.Button(rsswindow, text = 'Submit', command = rssvalue)#submit button
+        submit6.pack()
         
-    submit6 = tk.Button(rsswindow, text = 'Submit', command = rssvalue)#submit button
-    submit6.pack()
+    tasks.submit("theRSS", "Differentiating " + expression, job, done)
                          
     
 def theMC():
@@ -136,30 +382,21 @@ def theMC():
         Slope with a 95% CI
     '''
     #creates floats of all the values inputed in the GUI
-    x_1 = float(x1.get())
-    x_2 = float(x2.get())
-    x_3 = float(x3.get())
-    x_4= float(x4.get())
-    x_5 = float(x5.get())
-    Ux_1 = float(U_x1.get())
-    Ux_2 = float(U_x2.get())
-    Ux_3 = float(U_x3.get())
-    Ux_4 = float(U_x4.get())
-    Ux_5 = float(U_x5.get())
-    y_1 = float(y1.get())
-    y_2 = float(y2.get())
-    y_3 = float(y3.get())
-    y_4 = float(y4.get())
-    y_5 = float(y5.get())
-    Uy_1 = float(U_y1.get())
-    Uy_2 = float(U_y2.get())
-    Uy_3 = float(U_y3.get())
-    Uy_4 = float(U_y4.get())
-    Uy_5 = float(U_y5.get())
-    x, y = unc.getMonteCarlo((x_1,x_2,x_3,x_4, x_5), (y_1,y_2,y_3,y_4, y_5), 
-                      (Ux_1, Ux_2, Ux_3, Ux_4, Ux_5), (Uy_1, Uy_2, Uy_3, Uy_4, Uy_5), slope = True)#Monte Carlo simulation
-    label=tk.Label(tab3, text='The slope is ' + str(x)+' with a 95% confidence interval of ' + str(y))
-    label.pack(anchor=tk.S)
+    x_values = [float(entry.get()) for entry in (x1, x2, x3, x4, x5)]
+    Ux_values = [float(entry.get()) for entry in (U_x1, U_x2, U_x3, U_x4, U_x5)]
+    y_values = [float(entry.get()) for entry in (y1, y2, y3, y4, y5)]
+    Uy_values = [float(entry.get()) for entry in (U_y1, U_y2, U_y3, U_y4, U_y5)]
+    
+    def job(progress):
+        from MoMpy import Uncertainty as unc
+        return unc.getMonteCarlo(x_values, y_values, Ux_values, Uy_values, slope = True, callback = progress)#Monte Carlo simulation
+    
+    def done(values):
+        x, y = values
+        label=tk.Label(tab3, text='The slope is ' + str(x)+' with a 95% confidence interval of ' + str(y))
+        label.pack(anchor=tk.S)
+        
+    tasks.submit("theMC", "Running the Monte Carlo simulation", job, done)
     
     
 def Scrape():
@@ -169,34 +406,27 @@ def Scrape():
     Returns: 
         Material best suited for value
     '''
-    if (material.get() == 0):
-        materialwindow = tk.Tk()
-        x  =  web.Get_MatE(float(thevalue.get()))
-        for index, row in x.iterrows():
-            mylist  =  [row["Material"], row["Youngs Modulus (GPa)"]]
-            label14 = tk.Label(materialwindow, text = "The material is " + str(mylist[0]) + "with a Youngs Modulus of "  + 
-                             str(mylist[1])+ " GPa")
-            label14.pack()   
-    elif (material.get() == 1):
+    choice = material.get()
+    if choice not in (0, 1, 2):
+        raise ValueError("Please select the value you are entering")
+    value = float(thevalue.get())
+    column, name, unit = [("Youngs Modulus (GPa)", "Youngs Modulus", " GPa"), 
+                          ("Ultimate Tensile Strength (MPa)", "Ultimate Tensile Strength", " MPa"),
+                          ("Yield Strength (MPa)", "Yield Strength", " MPa")][choice]
+    
+    def job(progress):
+        from MoMpy import Webscraper as web
+        return [web.Get_MatE, web.Get_MatU, web.Get_MatY][choice](value)
+    
+    def done(x):
         materialwindow = tk.Tk()
-        x  =  web.Get_MatU(float(thevalue.get()))
         for index, row in x.iterrows():
-            mylist  =  [row["Material"], row["Ultimate Tensile Strength (MPa)"]]
-            label14 = tk.Label(materialwindow, text = "The material is " + 
-                               str(mylist[0]) + "with a Ultimate Tensile Strength of "  + 
-                             str(mylist[1])+ " MPa")
+            mylist  =  [row["Material"], row[column]]
+            label14 = tk.Label(materialwindow, text = "The material is " + str(mylist[0]) + "with a " + name + " of "  + 
+                             str(mylist[1])+ unit)
             label14.pack()
-    elif (material.get() == 2):
-        materialwindow = tk.Tk()
-        x  =  web.Get_MatY(float(thevalue.get()))
-        for index, row in x.iterrows():
-            mylist  =  [row["Material"], row["Yield Strength (MPa)"]]
-            label14 = tk.Label(materialwindow, text = "The material is " + 
-                               str(mylist[0]) + "with a Yield Strength of "  + 
-                             str(mylist[1])+ " MPa")
-            label14.pack()  
-    else:
-        raise ValueError("Please select the value you are entering")
+            
+    tasks.submit("Scrape", "Looking up materials", job, done)
         
         
 def matprop():
@@ -207,22 +437,33 @@ def matprop():
         properties of material
      If no value shows then the property doesnt exist
     '''
-    x=web.Get_Prop(matname.get())
-    for index, row in x.iterrows():
-        mylist  =  [row["Material"], row["Youngs Modulus (GPa)"],
-                    row["Ultimate Tensile Strength (MPa)"],  
-                    row["Yield Strength (MPa)"]]
-        label14 = tk.Label(tab4, text = "The material is " + str(mylist[0]) +
-                           "\n with a Youngs Modulus of "  + 
-                         str(mylist[1]) + " GPa \nand a Ultimate Tensile Strength of "  + 
-                       str(mylist[2])+ " MPa and a Yield Strength of "  + 
-                     str(mylist[3])+ " MPa")
-    label14.pack()
+    name = matname.get()
+    
+    def job(progress):
+        from MoMpy import Webscraper as web
+        return web.Get_Prop(name)
+    
+    def done(x):
+        for index, row in x.iterrows():
+            mylist  =  [row["Material"], row["Youngs Modulus (GPa)"],
+                        row["Ultimate Tensile Strength (MPa)"],  
+                        row["Yield Strength (MPa)"]]
+            label14 = tk.Label(tab4, text = "The material is " + str(mylist[0]) +
+                               "\n with a Youngs Modulus of "  + 
+                             str(mylist[1]) + " GPa \nand a Ultimate Tensile Strength of "  + 
+                           str(mylist[2])+ " MPa and a Yield Strength of "  + 
+                         str(mylist[3])+ " MPa")
+            label14.pack()
+            
+    tasks.submit("matprop", "Looking up " + name, job, done)
     
            
 #properties for Stress Strain Analysis   
 properties = ['Youngs Modulus', 'Yield Strength', 'Specific Stiffness',
             'Specific Strength', 'Ultimate Tensile Strength']
+#matching attributes of the getStressStrain result
+attributes = ['E', 'yield_strength', 'specific_stiffness',
+            'specific_strength', 'ultimate_strength']
 #Properties to find material
 moreprops = ['Youngs Modulus', 'Ultimate Tensile Strength', 'Yield Strength']
 
@@ -246,7 +487,22 @@ notebook.add(tab1, text = "Stress")
 notebook.add(tab2, text = "RSS")
 notebook.add(tab3, text = "MonteCarlo")
 notebook.add(tab4, text = "Webscraping")
+#status bar for the jobs running in the background
+statusbar = tk.Frame(root)
+statusbar.pack(side = tk.BOTTOM, fill = 'x')
+status = tk.Label(statusbar, text = "Ready", anchor = tk.W)
+status.pack(side = tk.LEFT, fill = 'x', expand = True)
+cancelbutton = tk.Button(statusbar, text = 'Cancel', command = lambda: tasks.cancel())
+cancelbutton.pack(side = tk.RIGHT)
+progressbar = ttk.Progressbar(statusbar, length = 150, maximum = 100)
+progressbar.pack(side = tk.RIGHT, padx = 5)
+timings = tk.BooleanVar(root, value = False)
+timingsbutton = tk.Checkbutton(statusbar, text = 'Timings', variable = timings)#shows where the time of each job went
+timingsbutton.pack(side = tk.RIGHT)
+tasks = TaskRunner(root, progressbar, status, timings = timings)
+
 notebook.pack(expand = True, fill = 'both')
+notebook.bind("<<NotebookTabChanged>>", prefetch)
 
 #tab1 contents
 label2 = tk.Label(tab1, text = "Enter the area of the specimen in mm\u00b2", font = 12)
@@ -285,6 +541,9 @@ submit1.pack(anchor = tk.W)
 graphbutton = tk.Button(tab1, text = "Press for graph", command = graphtime)
 graphbutton.pack(anchor = tk.S, pady = 50)
 
+livebutton = tk.Button(tab1, text = "Follow a running test", command = livegraph)
+livebutton.pack(anchor = tk.S)
+
 #tab2 contents
 label6 = tk.Label(tab2, text = "Enter the equation", font = 10)
 label6.pack(anchor = tk.W)
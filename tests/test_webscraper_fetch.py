@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Tests of Webscraper.Fetch_Tables against a local HTTP server that serves the pages in tests/fixtures, so nothing is
+downloaded from the internet. The server answers conditional requests with ETags and can be told to fail a page a few times.
+
+Run from the repository folder with: python -m pytest tests
+"""
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MoMpy import Webscraper
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+
+    """
+    Serves tests/fixtures/<name> at /<name> with an ETag, answers 304 to a matching If-None-Match, and 503 while
+    server.failures[path] is above 0.
+    """
+
+    def do_GET(self):
+        self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        if self.server.failures.get(self.path, 0) > 0:
+            self.server.failures[self.path] -= 1
+            return self._reply(503)
+        filename = os.path.join(FIXTURES, os.path.basename(self.path))
+        if not os.path.isfile(filename):
+            return self._reply(404)
+        with open(filename, "rb") as f:
+            body = f.read()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.not_modified += 1
+            return self._reply(304, headers = {"ETag": etag})
+        self._reply(200, body, {"ETag": etag, "Content-Type": "text/html; charset=utf-8"})
+
+    def _reply(self, status, body = b"", headers = {}):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+    httpd.hits, httpd.failures, httpd.not_modified = {}, {}, 0
+    httpd.base = f"http://127.0.0.1:{httpd.server_address[1]}/"
+    thread = threading.Thread(target = httpd.serve_forever, daemon = True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse = True)
+def fresh_session(tmp_path, monkeypatch):
+    #every test gets its own cache folder and a session without connections left open to an earlier server
+    monkeypatch.setattr(Webscraper, "SOURCES_CACHE", str(tmp_path / "sources"))
+    monkeypatch.setattr(Webscraper, "_session", None)
+    yield
+    Webscraper._session = None
+
+
+def test_combines_and_deduplicates_sources(server):
+    urls = [server.base + "materials_a.html", server.base + "materials_b.html"]
+    table = Webscraper.Fetch_Tables(urls)
+
+    assert table.attrs["errors"] == {}
+    assert table.attrs["status"] == {url: "downloaded" for url in urls}
+    names = table["Material"].tolist()
+    assert len(names) == len({Webscraper._Normalize_Name(name) for name in names})
+    assert "Titanium" in names and "Titanium Alloy" in names
+
+    copper = table[table["Material"].map(Webscraper._Normalize_Name) == "copper"].iloc[0]
+    assert copper["Material"] == "Copper" #the first source's spelling is kept
+    assert copper["Source"] == "; ".join(urls)
+    assert (copper["Youngs Modulus (GPa) min"], copper["Youngs Modulus (GPa) max"]) == (110, 130)
+    assert (copper["Ultimate Tensile Strength (MPa) min"], copper["Ultimate Tensile Strength (MPa) max"]) == (210, 250)
+
+    nylon = table[table["Material"] == "Nylon"].iloc[0]
+    assert (nylon["Youngs Modulus (GPa) min"], nylon["Youngs Modulus (GPa) max"]) == (2, 4)
+
+
+def test_downloaded_then_not_modified_then_offline(server):
+    urls = [server.base + "materials_a.html", server.base + "materials_b.html"]
+    first = Webscraper.Fetch_Tables(urls)
+    assert set(first.attrs["status"].values()) == {"downloaded"}
+
+    second = Webscraper.Fetch_Tables(urls)
+    assert set(second.attrs["status"].values()) == {"not modified"}
+    assert server.not_modified == 2
+    assert second.equals(first)
+
+    server.shutdown()
+    server.server_close()
+    Webscraper._session = None
+    Webscraper.Get_Session(retries = 0) #the refused connections would otherwise be retried with back off
+    third = Webscraper.Fetch_Tables(urls, timeout = 2)
+    assert set(third.attrs["status"].values()) == {"offline"}
+    assert third.equals(first)
+
+
+def test_failed_pages_are_reported_and_retried(server):
+    server.failures["/materials_b.html"] = 1
+    urls = [server.base + name for name in ("materials_a.html", "materials_b.html", "no_table.html", "missing.html")]
+    table = Webscraper.Fetch_Tables(urls)
+
+    assert server.hits["/materials_b.html"] == 2 #the 503 was retried
+    assert set(table.attrs["status"]) == set(urls[:2])
+    assert set(table.attrs["errors"]) == set(urls[2:])
+    assert table.attrs["errors"][urls[2]].startswith("ValueError")
+    assert table.attrs["errors"][urls[3]].startswith("HTTPError")
+
+
+def test_load_sources_is_used_by_the_lookups(server, monkeypatch):
+    monkeypatch.setattr(Webscraper, "_mydata", None)
+    Webscraper.Load_Sources([server.base + "materials_a.html", server.base + "materials_b.html"])
+
+    assert Webscraper.Get_Prop("Titanium")["Material"].tolist() == ["Titanium"]
+    assert "Titanium" in Webscraper.Get_MatE(110, tolerance = 0)["Material"].tolist()